@@ -0,0 +1,188 @@
+import argparse, io, json, os, random, resource, subprocess, sys, tempfile, time
+from contextlib import redirect_stdout
+
+from records import RowParser
+from synth import CARRIERS, synth_dataset
+
+"""
+🤔 Benchmarks for the hot paths:
+- Synthetic data only, so they run without a phone or the carrier API
+- Each benchmark prints records/sec so runs can be compared across changes
+- `stages` runs every pipeline stage on a synth.py dataset, each in a fresh child
+  process so its peak RSS is its own (ru_maxrss of a shared process only ever grows)
+"""
+
+def synthetic_rows(n, seed=0):
+    """Yield n call-log / SMS style `content query` rows, some with commas and = in values"""
+    rng = random.Random(seed)
+    bodies = ['See you at 5', 'Call me, ok?', 'Your code is a=b, c=d', 'Thanks!!', '']
+    for i in range(n):
+        number = '+1%010d' % rng.randrange(2000000000, 9999999999)
+        yield (f"Row: {i} _id={i}, address={number}, date={1600000000000 + i * 1000}, "
+               f"read=1, status=-1, type=1, body={rng.choice(bodies)}, seen=1")
+
+def synthetic_dat(path, n, distinct=50000, seed=0):
+    """Write n enriched call/SMS records over `distinct` numbers; returns the numbers"""
+    rng = random.Random(seed)
+    numbers = ['%010d' % rng.randrange(2000000000, 9999999999) for _ in range(distinct)]
+    numbers[:50] = ['406%07d' % i for i in range(50)]
+    numbers[50] = '7072668159'
+    carriers = {number: rng.choice(CARRIERS) for number in numbers}
+    with open(path, 'w') as f:
+        for i in range(n):
+            number = rng.choice(numbers)
+            carrier, carrier_type = carriers[number]
+            record = {'_id': str(i), 'number': number, 'date': str(1600000000000 + i), 'duration': str(rng.randrange(60))}
+            if carrier:
+                record.update(carrier=carrier, carrier_type=carrier_type)
+            if rng.random() < 0.1:
+                record['name'] = 'Somebody'
+            f.write(json.dumps(record) + '\n')
+    return numbers
+
+def legacy_parse(record):
+    """The split-based parser split.parse_record used before records.RowParser"""
+    parsed = {}
+    for k_v in record.split(','):
+        if '=' in k_v:
+            k, *v = k_v.split('=')
+            parsed[k.strip()] = v[0] if v else None
+    return parsed
+
+def time_parser(name, parse, rows):
+    start = time.perf_counter()
+    for row in rows:
+        parse(row)
+    elapsed = time.perf_counter() - start
+    print(f"{name:>12}: {len(rows) / elapsed:,.0f} records/sec ({elapsed:.2f}s)")
+
+def bench_parse(rows):
+    rows = list(synthetic_rows(rows))
+    print(f"Parsing {len(rows):,} synthetic rows")
+    time_parser('split-based', legacy_parse, rows)
+    time_parser('RowParser', RowParser(), rows)
+
+def bench_spam(rows):
+    import spam, spam_batch
+    workdir = tempfile.mkdtemp(prefix='tcpa_bench_')
+    infile = os.path.join(workdir, 'sms.dat')
+    numbers = synthetic_dat(infile, rows)
+    contacts = set(numbers[::3])
+    print(f"Classifying {rows:,} synthetic records")
+
+    results = {}
+    for name, process in [('process_file', spam.process_file), ('batch', spam_batch.process_file)]:
+        outfile = os.path.join(workdir, f'spam_{name}.dat')
+        start = time.perf_counter()
+        results[name] = process(infile, outfile, contacts, 'sms')
+        elapsed = time.perf_counter() - start
+        print(f"{name:>12}: {rows / elapsed:,.0f} records/sec ({elapsed:.2f}s)")
+
+    legacy, batch = results['process_file'], results['batch']
+    same = all(list(a.most_common()) == list(b.most_common()) for a, b in zip(legacy[:3] + legacy[4:], batch[:3] + batch[4:]))
+    same = same and legacy[3] == batch[3]
+    with open(os.path.join(workdir, 'spam_process_file.dat')) as a, open(os.path.join(workdir, 'spam_batch.dat')) as b:
+        same = same and a.read() == b.read()
+    print(f"Outputs identical: {same}")
+
+STAGES = ['extract-parse', 'split', 'spam', 'spam-batch', 'parse-stats']
+DUMP = 'phone_records_synth.json'
+OUTPUT_TYPES = ['calls', 'voicemails', 'sms']
+
+def run_stage(stage):
+    """Run one stage in the current (dataset) directory; returns records processed"""
+    if stage == 'extract-parse':
+        from extract import PROVIDERS, write_dump
+        from records import iter_records
+        write_dump(DUMP, '.', list(PROVIDERS))
+        parsers = {name: RowParser() for name in PROVIDERS}
+        count = 0
+        for section, raw in iter_records(DUMP):
+            parsers[section](raw)
+            count += 1
+        return count
+    if stage == 'split':
+        import split
+        with open(DUMP) as f:
+            raw_data = json.load(f)
+        with split.load_carriers('numbers.dat') as carriers:
+            *outputs, new_numbers = split.process_records(raw_data, carriers)
+        for output_type, records in zip(OUTPUT_TYPES, outputs):
+            split.write_records(f'{output_type}.dat', records)
+        return sum(map(len, outputs))
+    if stage in ('spam', 'spam-batch'):
+        import spam
+        process_file = spam.process_file
+        if stage == 'spam-batch':
+            from spam_batch import process_file
+        contacts = spam.load_contacts('contacts.json')
+        return sum(process_file(f'{record_type}.dat', f'spam_{record_type}.dat', contacts, record_type)[0]['total']
+                   for record_type in OUTPUT_TYPES)
+    if stage == 'parse-stats':
+        import parse
+        output = io.StringIO()
+        with redirect_stdout(output):
+            parse.main([DUMP])
+        return sum(int(line.split(':')[1]) for line in output.getvalue().splitlines()
+                   if line.startswith('Total records:'))
+    raise ValueError(f"Unknown stage {stage}")
+
+def stage_child(stage, workdir):
+    """Child side of bench_stages: run the stage and print its measurements as JSON"""
+    os.chdir(workdir)
+    start = time.perf_counter()
+    records = run_stage(stage)
+    elapsed = time.perf_counter() - start
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        rss //= 1024  # bytes there, KiB on Linux
+    print(json.dumps({'records': records, 'seconds': elapsed, 'rss_kb': rss}))
+
+def bench_stages(rows, stages=STAGES, workdir=None, seed=0):
+    workdir = workdir or tempfile.mkdtemp(prefix='tcpa_bench_')
+    start = time.perf_counter()
+    synth_dataset(workdir, calls=rows // 2, voicemails=rows // 10, sms=rows * 4 // 10 * 4 // 5,
+                  distinct=max(1000, rows // 20), seed=seed)
+    from carrier_store import CarrierStore
+    CarrierStore(os.path.join(workdir, 'numbers.dat')).close()  # index built up front, not in split
+    print(f"Generated ~{rows:,} synthetic rows in {workdir} ({time.perf_counter() - start:.1f}s)")
+
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        raise SystemExit(f"Unknown stages {sorted(unknown)}; choose from {STAGES}")
+    print(f"{'stage':>14} {'records':>10} {'seconds':>8} {'records/sec':>12} {'peak RSS':>10}")
+    # Pipeline order regardless of how they were given: spam reads split's output
+    for stage in [stage for stage in STAGES if stage in stages]:
+        if stage == 'spam-batch':
+            try:
+                import numpy  # noqa: F401
+            except ImportError:
+                print(f"{stage:>14}  skipped (needs numpy)")
+                continue
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), 'stage', stage, '--workdir', workdir],
+                              capture_output=True, text=True)
+        if proc.returncode:
+            print(f"{stage:>14}  failed:\n{proc.stderr}")
+            continue
+        result = json.loads(proc.stdout.splitlines()[-1])
+        rate = result['records'] / result['seconds'] if result['seconds'] else 0
+        print(f"{stage:>14} {result['records']:>10,} {result['seconds']:>8.2f} {rate:>12,.0f} "
+              f"{result['rss_kb'] / 1024:>8.1f}MB")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Pipeline benchmarks")
+    parser.add_argument('benchmark', choices=['parse', 'spam', 'stages', 'stage'])
+    parser.add_argument('stage', nargs='*', help="stages to run (default: all); one stage for `stage`")
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--workdir', help="dataset directory (default: a new temp dir)")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_intermixed_args()
+
+    if args.benchmark == 'parse':
+        bench_parse(args.rows)
+    elif args.benchmark == 'spam':
+        bench_spam(args.rows)
+    elif args.benchmark == 'stages':
+        bench_stages(args.rows, args.stage or STAGES, args.workdir, args.seed)
+    elif args.benchmark == 'stage':
+        stage_child(args.stage[0], args.workdir)
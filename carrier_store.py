@@ -0,0 +1,236 @@
+import hashlib, json, mmap, os, struct, sys, threading
+from array import array
+from bisect import bisect_left
+from phone import number_key
+
+"""
+🤔 Carrier store layout:
+- numbers.dat stays the append-only JSONL log (new lookups are still appended there)
+- numbers.dat.idx is a snapshot of the log: sorted integer number keys (phone.py) plus parallel
+  carrier / carrier_type ids into an interned string table, memory-mapped on open
+- Lines appended after the snapshot (the "tail") are replayed into a small dict on open
+- The snapshot is rebuilt if the log was replaced or rewritten rather than appended to
+  (different inode, shorter, or the covered bytes' head/tail digest changed)
+- Rebuilds write a temp file of their own and os.replace it in, under an flock on
+  numbers.dat.idx.lock: concurrent openers of a stale index (cron chains, fleet.py,
+  make_numbers.py) wait for one rebuild and then use it
+- Point lookups: tail dict first, then bisect over the mmap'd key array (O(log n))
+- Each entry keeps its lookup time ('ts', 0 for entries from before we tracked it) and
+  a negative flag for numbers the API had no data for ('status': 'unknown')
+<index_format>
+  header: magic, count, log bytes covered by the snapshot, offset of string table,
+          log inode, digest of the first and last 4 KiB of the covered bytes
+  keys:   count x uint64
+  ids:    count x uint32 carrier id, count x uint32 carrier_type id
+  times:  count x uint32 lookup time (epoch seconds)
+  flags:  count x uint8 (1 = negative entry)
+  json list of interned strings
+</index_format>
+"""
+
+MAGIC = b'TCPAIDX4'  # 3: phone.number_key (international numbers keyed by E.164), 4: log identity
+HEADER = struct.Struct('<8sQQQQ16s')
+DIGEST_BYTES = 4096
+REINDEX_TAIL = 100000  # rebuild the snapshot on open once the tail grows past this
+
+NEGATIVE = 'unknown'
+
+def record_values(data):
+    """(carrier, carrier_type, ts, negative) for one log record"""
+    if data.get('status') == NEGATIVE:
+        return None, None, int(data.get('ts') or 0), True
+    return (data.get('carrier', 'Unknown'),
+            data.get('carrier-type', data.get('carrier_type', 'Unknown')),
+            int(data.get('ts') or 0), False)
+
+def log_identity(path, size):
+    """(inode, digest of the first and last DIGEST_BYTES of the log's first size bytes)"""
+    if not os.path.exists(path):
+        return 0, bytes(16)
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        inode = os.fstat(f.fileno()).st_ino
+        digest.update(f.read(min(size, DIGEST_BYTES)))
+        f.seek(max(0, size - DIGEST_BYTES))
+        digest.update(f.read(size - f.tell()))
+    return inode, digest.digest()
+
+def read_log(path, offset=0):
+    """Yield (key, record_values) for log lines starting at byte offset"""
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            if not line.strip(): continue
+            data = json.loads(line)
+            key = number_key(data.get('number'))
+            if key is not None:
+                yield key, record_values(data)
+
+def build_index(path, index_path=None):
+    """One-shot migration: snapshot the whole JSONL log into an index file"""
+    index_path = index_path or path + '.idx'
+    log_size = os.path.getsize(path) if os.path.exists(path) else 0
+    entries = dict(read_log(path)) if log_size else {}  # later lines win
+
+    strings, string_ids = [], {}
+    def intern(value):
+        if value not in string_ids:
+            string_ids[value] = len(strings)
+            strings.append(value)
+        return string_ids[value]
+
+    keys = sorted(entries)
+    carrier_ids = [intern(entries[k][0]) for k in keys]
+    type_ids = [intern(entries[k][1]) for k in keys]
+    times = [entries[k][2] for k in keys]
+    flags = [entries[k][3] for k in keys]
+    strings_offset = HEADER.size + len(keys) * 21
+
+    tmp_path = f'{index_path}.{os.getpid()}.{threading.get_ident()}.tmp'  # one per writer
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, len(keys), log_size, strings_offset, *log_identity(path, log_size)))
+            # Native byte order, matching the memoryview casts on open
+            f.write(array('Q', keys).tobytes())
+            f.write(array('I', carrier_ids).tobytes())
+            f.write(array('I', type_ids).tobytes())
+            f.write(array('I', times).tobytes())
+            f.write(bytes(flags))
+            f.write(json.dumps(strings).encode())
+        os.replace(tmp_path, index_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return len(keys)
+
+class _RebuildLock:
+    """Exclusive flock on index_path + '.lock' (a no-op where fcntl is missing)"""
+    def __init__(self, index_path):
+        self.path = index_path + '.lock'
+        self.f = None
+
+    def __enter__(self):
+        try:
+            import fcntl
+        except ImportError:
+            return self
+        self.f = open(self.path, 'a')
+        fcntl.flock(self.f, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self.f is not None:
+            self.f.close()  # releases the lock
+
+class CarrierStore:
+    def __init__(self, path='numbers.dat', index_path=None):
+        self.path = path
+        self.index_path = index_path or path + '.idx'
+        self._mm = None
+        self._log = None
+        if not self._open_index():
+            with _RebuildLock(self.index_path):
+                if not self._open_index():  # unless another process rebuilt it meanwhile
+                    build_index(self.path, self.index_path)
+                    self._open_index()
+        self.tail = dict(read_log(self.path, self.indexed_bytes)) if self._log_size() > self.indexed_bytes else {}
+        if len(self.tail) > REINDEX_TAIL:
+            self.reindex()
+
+    def _log_size(self):
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def _open_index(self):
+        self._close_index()
+        if not os.path.exists(self.index_path): return False
+        with open(self.index_path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, indexed_bytes, strings_offset, inode, digest = HEADER.unpack_from(mm)
+        # Stale snapshot: written by another format, or the log was replaced/rewritten/truncated
+        if (magic != MAGIC or indexed_bytes > self._log_size()
+                or log_identity(self.path, indexed_bytes) != (inode, digest)):
+            mm.close()
+            return False
+        self._mm = mm
+        self.count = count
+        self.indexed_bytes = indexed_bytes
+        view = memoryview(mm)
+        keys_end = HEADER.size + count * 8
+        self.keys = view[HEADER.size:keys_end].cast('Q')
+        self.carrier_ids = view[keys_end:keys_end + count * 4].cast('I')
+        self.type_ids = view[keys_end + count * 4:keys_end + count * 8].cast('I')
+        self.times = view[keys_end + count * 8:keys_end + count * 12].cast('I')
+        self.flags = view[keys_end + count * 12:strings_offset]
+        self.strings = json.loads(mm[strings_offset:])
+        return True
+
+    def _close_index(self):
+        if self._mm is None: return
+        for view in (self.keys, self.carrier_ids, self.type_ids, self.times, self.flags):
+            view.release()
+        self._mm.close()
+        self._mm = None
+
+    def reindex(self):
+        self._close_index()
+        with _RebuildLock(self.index_path):
+            build_index(self.path, self.index_path)
+            self._open_index()
+        self.tail = {}
+
+    def lookup(self, key):
+        """(carrier, carrier_type, ts, negative) for an integer key, or None"""
+        if key in self.tail:
+            return self.tail[key]
+        i = self._indexed(key)
+        if i is None: return None
+        return (self.strings[self.carrier_ids[i]], self.strings[self.type_ids[i]],
+                self.times[i], bool(self.flags[i]))
+
+    def get(self, number, default=None):
+        """Carrier data for number; default if unknown or negatively cached"""
+        key = number_key(number)
+        values = self.lookup(key) if key is not None else None
+        if values is None or values[3]: return default
+        return {'carrier': values[0], 'carrier_type': values[1]}
+
+    def __getitem__(self, number):
+        record = self.get(number)
+        if record is None: raise KeyError(number)
+        return record
+
+    def __contains__(self, number):
+        return self.get(number) is not None
+
+    def __len__(self):
+        return self.count + sum(1 for key in self.tail if self._indexed(key) is None)
+
+    def _indexed(self, key):
+        i = bisect_left(self.keys, key)
+        return i if i < self.count and self.keys[i] == key else None
+
+    def add(self, record):
+        """Append a lookup result to the log and make it visible immediately"""
+        if self._log is None:
+            self._log = open(self.path, 'a')
+        self._log.write(json.dumps(record) + '\n')
+        self._log.flush()
+        key = number_key(record.get('number'))
+        if key is not None:
+            self.tail[key] = record_values(record)
+
+    def close(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+        self._close_index()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else 'numbers.dat'
+    print(f"Indexed {build_index(path)} numbers from {path} into {path}.idx")
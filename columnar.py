@@ -0,0 +1,213 @@
+import json, os
+
+"""
+🤔 Record files in either format, chosen by extension:
+- .dat      one JSON object per line (the original format)
+- .parquet  Parquet, carrier/carrier_type dictionary-encoded, zstd-compressed
+- .arrow    Arrow IPC file, same schema, memory-mapped on read
+All columns are strings. pyarrow is only imported when a columnar file is touched.
+Column projection (and Parquet row-group filters) are pushed down to the reader, so
+e.g. spam classification can read just number/carrier/carrier_type/name.
+Rows read back as dicts omit null columns, matching records that lacked the key.
+The schema is the columns of the first batch; a column first seen later (voicemail
+blob fields, fallback-parsed rows) starts a new segment with the wider schema, and
+segments are concatenated (earlier rows null in the new column) when the file closes.
+"""
+
+FORMATS = {'dat': '.dat', 'parquet': '.parquet', 'arrow': '.arrow'}
+DICTIONARY_COLUMNS = ('carrier', 'carrier_type')
+BASE_COLUMNS = ('number', 'carrier', 'carrier_type')
+BATCH_ROWS = 65536
+
+def record_file(name, fmt='dat'):
+    return name + FORMATS[fmt]
+
+def file_format(path):
+    for fmt, suffix in FORMATS.items():
+        if path.endswith(suffix) and fmt != 'dat':
+            return fmt
+    return 'dat'
+
+def find_record_file(name):
+    """Path of name.dat / name.parquet / name.arrow, the newest that exists (default .dat)
+
+    Newest, so a stale file left by an earlier run in another format never wins.
+    """
+    paths = [record_file(name, fmt) for fmt in ('parquet', 'arrow', 'dat')]
+    existing = [path for path in paths if os.path.exists(path)]
+    return max(existing, key=os.path.getmtime) if existing else record_file(name)
+
+def text(value):
+    return None if value is None else str(value)
+
+def make_schema(columns):
+    import pyarrow as pa
+    return pa.schema([pa.field(c, pa.dictionary(pa.int32(), pa.string()) if c in DICTIONARY_COLUMNS
+                               else pa.string()) for c in columns])
+
+class RecordWriter:
+    def __init__(self, path):
+        self.path = path
+        self.format = file_format(path)
+        self.batch = []
+        self.schema = None
+        self.writer = None
+        self.count = 0
+        self.segments = []
+        self.f = open(path, 'w') if self.format == 'dat' else None
+
+    def write(self, record):
+        self.count += 1
+        if self.f is not None:
+            self.f.write(json.dumps(record) + '\n')
+            return
+        self.batch.append(record)
+        if len(self.batch) >= BATCH_ROWS:
+            self.flush()
+
+    def write_table(self, table):
+        """Append a pyarrow Table; rows are converted when writing .dat"""
+        if self.f is not None:
+            for batch in table.to_batches(BATCH_ROWS):
+                for row in batch.to_pylist():
+                    self.write({k: v for k, v in row.items() if v is not None})
+            return
+        self.flush()
+        if self.writer is None:
+            self._open(table.schema)
+        self.writer.write_table(table.cast(self.schema))
+        self.count += table.num_rows
+
+    def _open(self, schema):
+        self.schema = schema
+        if self.format == 'parquet':
+            import pyarrow.parquet as pq
+            self.writer = pq.ParquetWriter(self.path, schema, compression='zstd')
+        else:
+            import pyarrow as pa
+            self.writer = pa.ipc.new_file(self.path, schema)
+
+    def flush(self):
+        if not self.batch: return
+        import pyarrow as pa
+        if self.schema is None:
+            # Schema = columns seen in the first batch (plus carrier data), in first-seen order
+            columns = dict.fromkeys(BASE_COLUMNS)
+            for record in self.batch:
+                columns.update(dict.fromkeys(record))
+            self._open(make_schema(columns))
+        names = set(self.schema.names)
+        extra = {key: None for record in self.batch for key in record if key not in names}
+        if extra:
+            self._widen(extra)
+        table = pa.Table.from_pydict({name: pa.array([text(record.get(name)) for record in self.batch], pa.string())
+                                      for name in self.schema.names})
+        self.writer.write_table(table.cast(self.schema))
+        self.batch = []
+
+    def _segment_path(self, n):
+        name, ext = os.path.splitext(self.path)
+        return f'{name}.seg{n}{ext}'
+
+    def _widen(self, columns):
+        """Finish the rows written so far as a segment and continue with the extra columns"""
+        import pyarrow as pa
+        self.writer.close()
+        segment = self._segment_path(len(self.segments))
+        os.replace(self.path, segment)
+        self.segments.append(segment)
+        self._open(pa.schema(list(self.schema) + list(make_schema(columns))))
+
+    def close(self):
+        if self.f is not None:
+            self.f.close()
+            return
+        self.flush()
+        if self.writer is None:
+            self._open(make_schema(BASE_COLUMNS))
+        self.writer.close()
+        if self.segments:
+            segments, self.segments = self.segments + [self._segment_path(len(self.segments))], []
+            os.replace(self.path, segments[-1])
+            concat_record_files(segments, self.path)
+            for segment in segments:
+                os.remove(segment)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def read_table(path, columns=None, filters=None):
+    """Read a columnar record file as a pyarrow Table with projection/filter pushdown"""
+    # Requested columns missing from the file are skipped, like absent keys in .dat
+    if columns is not None:
+        columns = [c for c in columns if c in read_schema(path).names]
+    if file_format(path) == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.read_table(path, columns=columns, filters=filters)
+    import pyarrow as pa
+    table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+    if columns is not None:
+        table = table.select(columns)
+    if filters is not None:
+        import pyarrow.parquet as pq
+        table = table.filter(pq.filters_to_expression(filters))
+    return table
+
+def read_records(path, columns=None):
+    """Yield record dicts from any record file, optionally only some columns"""
+    if file_format(path) == 'dat':
+        with open(path) as f:
+            for line in f:
+                record = json.loads(line.strip())
+                yield record if columns is None else {c: record[c] for c in columns if c in record}
+        return
+    if file_format(path) == 'parquet':
+        import pyarrow.parquet as pq
+        names = [c for c in columns if c in read_schema(path).names] if columns else None
+        batches = pq.ParquetFile(path).iter_batches(batch_size=BATCH_ROWS, columns=names)
+    else:
+        batches = read_table(path, columns).to_batches(BATCH_ROWS)
+    for batch in batches:
+        for row in batch.to_pylist():
+            yield {k: v for k, v in row.items() if v is not None}
+
+def read_schema(path):
+    if file_format(path) == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.read_schema(path)
+    import pyarrow as pa
+    return pa.ipc.open_file(pa.memory_map(path)).schema
+
+def concat_record_files(paths, out_path):
+    """Concatenate record files of one format into out_path, unifying columnar schemas"""
+    if file_format(out_path) == 'dat':
+        import shutil
+        with open(out_path, 'wb') as out:
+            for path in paths:
+                with open(path, 'rb') as part:
+                    shutil.copyfileobj(part, out, 1 << 20)
+        return
+    import pyarrow as pa
+    columns = {}
+    for path in paths:
+        for field in read_schema(path):
+            columns.setdefault(field.name, field)
+    schema = pa.schema(list(columns.values()))
+    def tables():
+        for path in paths:
+            table = read_table(path)
+            for field in schema:
+                if field.name not in table.column_names:
+                    table = table.append_column(field, pa.nulls(table.num_rows, field.type))
+            yield table.select(schema.names)
+    with RecordWriter(out_path) as writer:
+        writer._open(schema)
+        if file_format(out_path) == 'arrow':
+            # An IPC file holds one dictionary per column: unify the parts' dictionaries
+            writer.write_table(pa.concat_tables(tables()).unify_dictionaries())
+        else:
+            for table in tables():
+                writer.write_table(table)
@@ -1,91 +1,104 @@
-import subprocess, json, time
+import argparse, json, time
 from datetime import datetime
+from extract import AdbShell, query_command
+from keyset import keyset_path, write_keyset
+from phone import format_number, number_key
+from records import RowParser, iter_row_lines
 
 """
-🤔 Enhanced data capture strategy:
-- Store ALL fields returned by the content provider
-- Keep display simple with just name/number
-- Store raw field format to help debug content provider responses
-- Use set to track which numbers we've seen to avoid duplicates
+🤔 Streaming contact capture:
+- Rows stream line by line from a persistent adb shell instead of buffering each
+  provider's whole output
+- Providers are queried with a projection of just the columns we keep, so synced
+  accounts' photo/lookup/ringtone metadata never crosses adb
+- Rows are parsed with the projection as the column list, so names with spaces or
+  commas survive
+- Contacts are merged by canonical number key (phone.py) as they arrive; memory is one
+  small dict entry per distinct number
+- Output is written progressively to contacts_<ts>.jsonl, one line per number (a later
+  line for the same number, when a name turns up, supersedes the earlier one), plus the
+  contacts_<ts>.bin keyset spam.py memory-maps
 <query_formats>
 The query results come back in formats like:
-  display_name=John number=1234567890 custom_ringtone=/path/to/ring.mp3
-  _id=42 lookup_key=3030j times_contacted=5 starred=0
-We want to capture all of these fields while staying organized
+  Row: 0 contact_id=42, display_name=Smith, John, data1=+1 (234) 567-8900
+  Row: 1 name=John Smith, number=1234567890
 </query_formats>
 """
 
-def normalize_phone(number):
-    return ''.join(filter(str.isdigit, number))
+# (uri, projection, number column, name column); every provider is read and merged
+CONTACT_PROVIDERS = [
+    ('content://com.android.contacts/data/phones', ['contact_id', 'display_name', 'data1'], 'data1', 'display_name'),
+    ('content://contacts/phones', ['name', 'number'], 'number', 'name'),
+]
 
-def run_query(uri, description=""):
-    cmd = ['adb', 'shell', 'content', 'query', '--uri', uri]
-    try:
-        output = subprocess.check_output(cmd).decode()
-        return [line for line in output.split('\n') if line.strip()]
-    except subprocess.CalledProcessError as e:
-        print(f"Error querying {description}: {e.output.decode() if e.output else str(e)}")
-        return []
+def query_rows(shell, uri, projection):
+    """Yield parsed rows of uri (projected columns only), streamed from the shell"""
+    lines = shell.run(query_command(uri, projection=projection))
+    parse_row = RowParser(projection)
+    for row in iter_row_lines(line for line in lines if line.strip() and line.strip() != 'No result found.'):
+        if not row[0].startswith('Row:'):
+            print(f"Error querying {uri}: {row[0]}")
+            for _ in lines: pass  # drain so the shell can run the next command
+            return
+        yield parse_row('\n'.join(row))
+
+def clean_value(value):
+    value = (value or '').strip().strip('"')
+    return '' if value == 'NULL' else value
 
-def get_contacts():
+def stream_contacts(shell, out, providers=CONTACT_PROVIDERS):
+    """Write one JSON line per distinct number to out; returns {key: has_name}"""
     contacts = {}
-    seen_numbers = set()
-    
-    base_uris = [
-        'content://com.android.contacts/contacts',
-        'content://contacts/phones'
-    ]
-    
-    for uri in base_uris:
-        results = run_query(uri, f"contacts from {uri}")
-        for result in results:
-            # Store all fields
-            fields = dict(item.split('=', 1) for item in result.split(' ') if '=' in item)
-            
-            # But require at least number for contact to be useful
-            number = fields.get('number', '').strip('"')
-            if not number:
+    for uri, projection, number_column, name_column in providers:
+        for fields in query_rows(shell, uri, projection):
+            raw_number = clean_value(fields.get(number_column))
+            key = number_key(raw_number)
+            if key is None:
                 continue
-                
-            norm_number = normalize_phone(number)
-            if norm_number in seen_numbers:
-                # Merge any new fields with existing record
-                contacts[norm_number].update(fields)
+            name = clean_value(fields.get(name_column))
+            # Already have this number, and this row doesn't add a missing name
+            if key in contacts and (contacts[key] or not name):
                 continue
-                
-            seen_numbers.add(norm_number)
-            
-            # Store everything but organize critical fields at top level
-            contacts[norm_number] = {
-                'name': fields.get('display_name', '').strip('"'),
-                'raw_number': number,
-                'normalized_number': norm_number,
-                'raw_data': fields  # Store all fields
-            }
-    
+            contacts[key] = bool(name)
+            out.write(json.dumps({'number': format_number(key), 'name': name,
+                                  'raw_number': raw_number, 'source': uri}) + '\n')
     return contacts
 
-if __name__ == '__main__':
+def extract_contacts(filename, serial=None, providers=CONTACT_PROVIDERS):
+    """Stream contacts from the device into filename (.jsonl) and its keyset; returns the count"""
+    shell = AdbShell(serial)
+    try:
+        with open(filename, 'w') as out:
+            contacts = stream_contacts(shell, out, providers)
+    finally:
+        shell.close()
+    write_keyset(keyset_path(filename), contacts)
+    return len(contacts)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Extract contacts' phone numbers over adb")
+    parser.add_argument('--serial', help="adb device serial")
+    parser.add_argument('-o', '--output', help="default contacts_<timestamp>.jsonl")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """Extract contacts; returns the .jsonl filename"""
+    args = parse_args(argv)
     print("Extracting contacts...")
-    contacts = get_contacts()
-    
+    start = time.time()
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = f'contacts_{timestamp}.json'
-    
-    with open(filename, 'w') as f:
-        json.dump(contacts, f, indent=2)
-    
-    print(f"\nExtracted {len(contacts)} contacts")
-    print(f"Data saved to {filename}")
-    
-    if contacts:
+    filename = args.output or f'contacts_{timestamp}.jsonl'
+    count = extract_contacts(filename, args.serial)
+
+    print(f"\nExtracted {count} contacts in {time.time() - start:.1f}s")
+    print(f"Data saved to {filename} (membership keyset: {keyset_path(filename)})")
+
+    if count:
         print("\nExample contact (name/number only):")
-        sample_number = next(iter(contacts))
-        contact = contacts[sample_number]
-        print(json.dumps({
-            'name': contact['name'],
-            'number': contact['raw_number']
-        }, indent=2))
-        
-        print("\nAvailable fields in raw_data:")
-        print(list(contacts[sample_number]['raw_data'].keys()))
\ No newline at end of file
+        with open(filename) as f:
+            contact = json.loads(f.readline())
+        print(json.dumps({'name': contact['name'], 'number': contact['raw_number']}, indent=2))
+    return filename
+
+if __name__ == '__main__':
+    main()
@@ -1,87 +1,291 @@
-import subprocess, json, time
+import argparse, subprocess, json, os, queue, re, shlex, shutil, tempfile, time, uuid
+import metrics
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from records import iter_row_lines, iter_sections
 
-def run_query(uri, description=""):
-    cmd = [
-        'adb', 
-        'shell', 
-        'content', 
-        'query', 
-        '--uri', 
-        uri
-    ]
-    try:
-        output = subprocess.check_output(cmd).decode()
-        return [line for line in output.split('\n') if line.strip()]
-    except subprocess.CalledProcessError as e:
-        if "Could not find provider" in str(e.output):
+"""
+🤔 Extraction engine:
+- A small pool of persistent `adb shell` sessions instead of one adb process per query
+- Each provider is queried on its own session concurrently, so a full pull takes as
+  long as the slowest provider rather than the sum of all of them
+- Output is streamed line by line into a per-provider file, then assembled into the
+  usual phone_records_*.json without holding everything in memory
+- ADB can point at a fake adb executable for testing
+- Incremental mode keeps a dataset dir with a checkpoint of the max date/_id per
+  provider and only asks the device for rows at or after it (--where/--sort),
+  then appends them to the dataset deduplicated by _id
+"""
+
+ADB = os.environ.get('ADB', 'adb')
+
+VOICEMAIL_URIS = [
+    'content://voicemail/voicemail',
+    'content://com.android.voicemail/voicemail',
+    'content://com.android.providers.voicemail/voicemail'
+]
+
+# Provider name -> candidate URIs, tried in order until one returns rows
+PROVIDERS = {
+    'calls': ['content://call_log/calls'],
+    'voicemail': VOICEMAIL_URIS,
+    'sms_inbox': ['content://sms/inbox'],
+    'sms_sent': ['content://sms/sent'],
+}
+
+CHECKPOINT_FILE = 'checkpoint.json'
+
+_id_field = re.compile(r'(?:^|\s|, )_id=(\d+)')
+_date_field = re.compile(r', date=(\d+)')
+
+class AdbError(Exception):
+    pass
+
+class AdbShell:
+    """A long-lived `adb shell` session that runs one command at a time"""
+    def __init__(self, serial=None):
+        cmd = [ADB] + (['-s', serial] if serial else []) + ['shell']
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                     stderr=subprocess.STDOUT, text=True, bufsize=1,
+                                     errors='replace')
+
+    def run(self, command):
+        """Yield the command's output lines; the exit status is in self.status afterwards.
+
+        The generator must be consumed fully before the next run() on this shell.
+        """
+        marker = f'__TCPA_END_{uuid.uuid4().hex}__'
+        # The bare echo terminates output that doesn't end in a newline
+        self.proc.stdin.write(f'{command} 2>&1; status=$?; echo; echo {marker} $status\n')
+        self.proc.stdin.flush()
+        self.status = None
+        for line in self.proc.stdout:
+            if line.startswith(marker):
+                self.status = int(line.split()[1])
+                return
+            yield line.rstrip('\r\n')
+        raise AdbError(f"adb shell exited while running: {command}")
+
+    def close(self):
+        try:
+            self.proc.stdin.write('exit\n')
+            self.proc.stdin.close()
+        except (BrokenPipeError, OSError):
+            pass
+        try:
+            self.proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+
+def query_command(uri, where=None, sort=None, projection=None):
+    cmd = f"content query --uri {shlex.quote(uri)}"
+    if projection: cmd += f" --projection {shlex.quote(':'.join(projection))}"
+    if where: cmd += f" --where {shlex.quote(where)}"
+    if sort: cmd += f" --sort {shlex.quote(sort)}"
+    return cmd
+
+def query_to_file(shell, uri, description, path, where=None):
+    """Stream `content query` output for uri into path, returning the row count (0 on error)"""
+    count = 0
+    error = None
+    command = query_command(uri, where, 'date ASC' if where else None)
+    with open(path, 'w') as f:
+        for line in shell.run(command):
+            if not line.strip() or line.strip() == 'No result found.':
+                continue
+            if count == 0 and error is None and (line.startswith('Error') or 'Could not find provider' in line):
+                error = line
+            if error is not None:
+                continue
+            f.write(line + '\n')
+            count += 1
+    if error or shell.status:
+        metrics.inc('extract_errors', provider=description)
+        if error and "Could not find provider" in error:
             print(f"Provider not available for {description}")
         else:
-            print(f"Error querying {description}: {e.output.decode() if e.output else str(e)}")
-        return []
-
-def try_get_voicemail():
-    # Try different known voicemail URIs
-    voicemail_uris = [
-        'content://voicemail/voicemail',
-        'content://com.android.voicemail/voicemail',
-        'content://com.android.providers.voicemail/voicemail'
-    ]
-    
-    for uri in voicemail_uris:
-        print(f"Trying voicemail URI: {uri}")
-        results = run_query(uri, "voicemail")
-        if results:
-            return results
-    return []
-
-def get_all_records():
-    # Calculate timestamp for 3 years ago
-    three_years_ago = int((datetime.now() - timedelta(days=3*365)).timestamp() * 1000)
-    
-    # Get calls
-    print("Getting calls...")
-    calls = run_query('content://call_log/calls', "calls")
-    
-    # Get voicemails
-    print("\nGetting voicemail...")
-    voicemails = try_get_voicemail()
-    
-    # Get SMS
-    print("\nGetting SMS inbox...")
-    sms_inbox = run_query('content://sms/inbox', "SMS inbox")
-    
-    print("Getting SMS sent...")
-    sms_sent = run_query('content://sms/sent', "SMS sent")
-    
-    return {
-        'calls': calls,
-        'voicemail': voicemails,
-        'sms_inbox': sms_inbox,
-        'sms_sent': sms_sent
-    }
+            print(f"Error querying {description}: {error or f'exit status {shell.status}'}")
+        open(path, 'w').close()
+        return 0
+    return count
 
-if __name__ == '__main__':
+def extract_provider(shells, name, uris, path, where=None):
+    shell = shells.get()
+    try:
+        with metrics.timer('extract_provider_seconds', provider=name):
+            for uri in uris:
+                if len(uris) > 1:
+                    print(f"Trying {name} URI: {uri}")
+                count = query_to_file(shell, uri, name, path, where)
+                if count:
+                    metrics.inc('extract_rows', count, provider=name)
+                    return count
+            return 0
+    finally:
+        shells.put(shell)
+
+def extract_all(workdir, serial=None, workers=None, providers=PROVIDERS, wheres=None):
+    """Pull every provider concurrently into workdir/<name>.lines; returns {name: count}
+
+    wheres optionally maps provider name -> `--where` clause for that provider.
+    """
+    wheres = wheres or {}
+    workers = workers or len(providers)
+    shells = queue.Queue()
+    opened = [AdbShell(serial) for _ in range(workers)]
+    for shell in opened:
+        shells.put(shell)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {name: pool.submit(extract_provider, shells, name, uris,
+                                         os.path.join(workdir, f'{name}.lines'),
+                                         wheres.get(name))
+                       for name, uris in providers.items()}
+            return {name: future.result() for name, future in futures.items()}
+    finally:
+        for shell in opened:
+            shell.close()
+
+def iter_lines(path):
+    if not os.path.exists(path): return
+    with open(path) as f:
+        for line in f:
+            yield line.rstrip('\n')
+
+def load_checkpoint(datadir):
+    path = os.path.join(datadir, CHECKPOINT_FILE)
+    if not os.path.exists(path): return {}
+    with open(path) as f:
+        return json.load(f)
+
+def save_checkpoint(datadir, checkpoint):
+    path = os.path.join(datadir, CHECKPOINT_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+def incremental_wheres(checkpoint, floor=None):
+    """`--where` per provider: rows at or after the last date seen (or floor on first run).
+
+    `>=` rather than `>` so rows sharing the checkpoint's timestamp aren't lost;
+    merge_rows drops the ones we already have.
+    """
+    wheres = {}
+    for name in PROVIDERS:
+        since = checkpoint.get(name, {}).get('date', floor)
+        if since is not None:
+            wheres[name] = f'date >= {since}'
+    return wheres
+
+def row_ids(path):
+    ids = set()
+    for line in iter_lines(path):
+        m = _id_field.search(line) if line.startswith('Row:') else None
+        if m: ids.add(int(m.group(1)))
+    return ids
+
+def merge_rows(new_path, data_path, entry):
+    """Append rows from new_path to data_path, skipping _ids already present.
+
+    Returns (rows added, updated checkpoint entry).
+    """
+    entry = dict(entry or {})
+    seen = row_ids(data_path)
+    added = 0
+    with open(data_path, 'a') as out:
+        for row in iter_row_lines(iter_lines(new_path)):
+            m = _id_field.search(row[0])
+            row_id = int(m.group(1)) if m else None
+            if row_id is not None:
+                if row_id in seen: continue
+                seen.add(row_id)
+                entry['_id'] = max(entry.get('_id', row_id), row_id)
+            m = _date_field.search(row[0])
+            if m:
+                entry['date'] = max(entry.get('date', 0), int(m.group(1)))
+            out.write('\n'.join(row) + '\n')
+            added += 1
+    return added, entry
+
+def write_dump(filename, workdir, names):
+    """Assemble per-provider line files into the phone_records JSON layout (indent=2)"""
+    write_sections(filename, {name: iter_lines(os.path.join(workdir, f'{name}.lines')) for name in names})
+
+def write_sections(filename, sections):
+    """Write {name: iterable of raw lines} as a phone_records JSON dump, streaming"""
+    with open(filename, 'w') as out:
+        out.write('{')
+        for i, (name, lines) in enumerate(sections.items()):
+            out.write(',' if i else '')
+            out.write(f'\n  {json.dumps(name)}: [')
+            empty = True
+            for line in lines:
+                out.write(('\n' if empty else ',\n') + '    ' + json.dumps(line))
+                empty = False
+            out.write(']' if empty else '\n  ]')
+        out.write('\n}' if sections else '}')
+
+def extract_dump(filename, serial=None, incremental=None, since=None):
+    """Pull every provider into the phone_records dump filename; returns {name: count}
+
+    With incremental (a dataset dir) only rows at or after its checkpoint (since, in ms,
+    on the first run) are pulled and merged in, and the dump covers the whole dataset.
+    """
+    workdir = tempfile.mkdtemp(prefix='tcpa_extract_')
+    try:
+        if incremental:
+            os.makedirs(incremental, exist_ok=True)
+            checkpoint = load_checkpoint(incremental)
+            with metrics.stage('extract'):
+                counts = extract_all(workdir, serial, wheres=incremental_wheres(checkpoint, since))
+            for name in PROVIDERS:
+                counts[name], checkpoint[name] = merge_rows(
+                    os.path.join(workdir, f'{name}.lines'),
+                    os.path.join(incremental, f'{name}.lines'),
+                    checkpoint.get(name))
+            save_checkpoint(incremental, checkpoint)
+            datadir = incremental
+        else:
+            with metrics.stage('extract'):
+                counts = extract_all(workdir, serial)
+            datadir = workdir
+        write_dump(filename, datadir, list(PROVIDERS))
+        return counts
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Extract call, voicemail and SMS records over adb")
+    parser.add_argument('--incremental', metavar='DATADIR',
+                        help="keep a checkpointed dataset in DATADIR and only pull new rows")
+    parser.add_argument('--since-days', type=int, default=3*365,
+                        help="how far back the first incremental pull goes")
+    parser.add_argument('--serial', help="adb device serial")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """Run an extraction; returns the dump's filename"""
+    args = parse_args(argv)
     print("Extracting phone records...")
-    records = get_all_records()
-    
-    # Save all data to JSON
+    start = time.time()
+    since = int((datetime.now() - timedelta(days=args.since_days)).timestamp() * 1000)
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     filename = f'phone_records_{timestamp}.json'
-    
-    with open(filename, 'w') as f:
-        json.dump(records, f, indent=2)
-    
+    counts = extract_dump(filename, args.serial, args.incremental, since)
+
     # Print summary
-    print("\nExtraction complete!")
-    for record_type, data in records.items():
-        count = len(data) if data else 0
-        print(f"{record_type}: {count} records")
-    
+    print(f"\nExtraction complete in {time.time() - start:.1f}s!")
+    for record_type, count in counts.items():
+        print(f"{record_type}: {count} {'new ' if args.incremental else ''}records")
+
     print(f"\nData saved to {filename}")
-    
+
     # Print example records if available
-    for record_type, data in records.items():
-        if data:
+    for record_type, records in iter_sections(filename):
+        if counts.get(record_type):
             print(f"\nExample {record_type} record:")
-            print(data[0])
\ No newline at end of file
+            print(next(records))
+    return filename
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+import os, re, shlex, sys
+from extract import PROVIDERS
+
+"""
+🤔 A fake `adb` that answers `content query` from canned output, so extraction runs
+without a phone: `ADB=./fake_adb.py FAKE_ADB_DATA=<dir> python extract.py`
+- <dir> holds the rows each provider returns as <name>.lines (the files synth.py
+  writes: calls, voicemail, sms_inbox, sms_sent; contacts.lines / contacts_legacy.lines
+  for contacts.py), or one subdirectory per device serial holding those files
+- `devices` lists the serials (a `state` file in a device's directory overrides
+  `device`, e.g. `unauthorized`); a single flat <dir> is one device, emulator-5554
+- `shell` runs the commands AdbShell writes to stdin one at a time: --where `col >= N`
+  clauses are applied (date/_id filters for incremental extracts); --projection and
+  --sort are not (canned rows are already in the device's column and date order)
+- A provider without a .lines file answers like a missing provider
+- FAKE_ADB_DROP="serial[:n] ...": each of that device's shells exits after n commands
+  (default 0), like a handset unplugged mid-run
+"""
+
+DEFAULT_SERIAL = 'emulator-5554'
+URI_FILES = {uri: name for name, uris in PROVIDERS.items() for uri in uris}
+URI_FILES.update({'content://com.android.contacts/data/phones': 'contacts',
+                  'content://contacts/phones': 'contacts_legacy'})
+COMMAND = re.compile(r'(?P<command>.*?) 2>&1; status=\$\?; echo; echo (?P<marker>\S+) \$status\s*\Z')
+CONDITION = re.compile(r'(\w+)\s*(>=|<=|!=|=|>|<)\s*(-?\d+)')
+OPERATORS = {'>=': int.__ge__, '<=': int.__le__, '!=': int.__ne__, '=': int.__eq__,
+             '>': int.__gt__, '<': int.__lt__}
+
+def data_dir():
+    return os.environ.get('FAKE_ADB_DATA', '.')
+
+def devices():
+    """{serial: (directory, state)}"""
+    root = data_dir()
+    found = {}
+    for name in sorted(os.listdir(root)):
+        path = os.path.join(root, name)
+        if os.path.isdir(path) and any(f.endswith('.lines') or f == 'state' for f in os.listdir(path)):
+            state_file = os.path.join(path, 'state')
+            state = open(state_file).read().strip() if os.path.exists(state_file) else 'device'
+            found[name] = (path, state)
+    return found or {DEFAULT_SERIAL: (root, 'device')}
+
+def drop_after(serial):
+    for entry in os.environ.get('FAKE_ADB_DROP', '').split():
+        name, _, count = entry.partition(':')
+        if name == serial:
+            return int(count or 0)
+    return None
+
+def matches(row, conditions):
+    for column, op, value in conditions:
+        m = re.search(rf'(?:^Row: \d+ |, ){column}=(-?\d+)', row)
+        if m is None or not OPERATORS[op](int(m.group(1)), int(value)):
+            return False
+    return True
+
+def content_query(directory, args):
+    """Print a provider's canned rows; returns the exit status"""
+    options = dict(zip(args[2::2], args[3::2])) if args[:2] == ['content', 'query'] else {}
+    uri = options.get('--uri')
+    if uri is None:
+        print(f"/system/bin/sh: {args[0] if args else ''}: not found")
+        return 127
+    name = URI_FILES.get(uri)
+    path = os.path.join(directory, f'{name}.lines') if name else None
+    if path is None or not os.path.exists(path):
+        print(f"Error while accessing provider:{uri.split('/')[2]}")
+        print(f"java.lang.IllegalArgumentException: Could not find provider: {uri}")
+        return 1
+    conditions = CONDITION.findall(options.get('--where', ''))
+    rows = 0
+    with open(path) as f:
+        keep = False
+        for line in f:
+            if line.startswith('Row:'):
+                keep = matches(line, conditions)
+                rows += keep
+            if keep:
+                sys.stdout.write(line)
+    if not rows:
+        print("No result found.")
+    return 0
+
+def shell(serial):
+    found = devices()
+    if serial is None:
+        if len(found) > 1:
+            print("error: more than one device/emulator")
+            return 1
+        serial = next(iter(found))
+    if serial not in found or found[serial][1] != 'device':
+        print(f"error: device '{serial}' not found" if serial not in found else f"error: device {found[serial][1]}")
+        return 1
+    directory = found[serial][0]
+    remaining = drop_after(serial)
+    for line in sys.stdin:
+        if line.strip() == 'exit':
+            return 0
+        if remaining is not None:
+            if remaining <= 0:
+                print("error: closed")
+                return 1
+            remaining -= 1
+        m = COMMAND.match(line)
+        status = content_query(directory, shlex.split(m.group('command') if m else line))
+        if m:
+            print()
+            print(f"{m.group('marker')} {status}")
+        sys.stdout.flush()
+    return 0
+
+def main(argv):
+    serial = None
+    if argv[:1] == ['-s']:
+        serial, argv = argv[1], argv[2:]
+    if argv[:1] == ['devices']:
+        print("List of devices attached")
+        for name, (_, state) in devices().items():
+            print(f"{name}\t{state}")
+        print()
+        return 0
+    if argv[:1] == ['shell'] and len(argv) == 1:
+        return shell(serial)
+    print(f"fake adb: unsupported command: {' '.join(argv)}", file=sys.stderr)
+    return 1
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
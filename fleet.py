@@ -0,0 +1,202 @@
+import argparse, json, os, re, subprocess, threading, time
+import metrics
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from carrier_store import CarrierStore
+from contacts import extract_contacts
+from extract import ADB, AdbError, extract_dump, iter_lines
+from phone import format_number, number_key
+from records import RowParser, iter_row_lines, with_learned_columns
+
+"""
+🤔 Extracting a fleet of handsets in one run:
+- `adb devices` gives the serials; devices that are offline/unauthorized are reported
+  and skipped, and --serial limits the run to some of them
+- Each device gets its own directory (<outdir>/<serial>/) with an incremental extract
+  dataset, phone_records.json, contacts.jsonl/.bin and the numbers it called or texted
+- Devices run concurrently on a bounded pool (--workers); each one already pulls its
+  providers over parallel shells, so the pool stays small
+- fleet_state.json records each device's finished steps; a device that disconnects
+  mid-run keeps its last checkpoint and is picked up from there on the next run,
+  devices that finished are skipped unless --refresh (which pulls only newer rows)
+- Every device's numbers are merged into one deduplicated new_numbers.txt (minus the
+  ones the carrier store already knows) for make_numbers.py to look up in one batch
+<fleet_layout>
+  fleet/fleet_state.json
+  fleet/new_numbers.txt
+  fleet/<serial>/data/           incremental dataset + checkpoint.json
+  fleet/<serial>/phone_records.json
+  fleet/<serial>/contacts.jsonl, contacts.bin
+  fleet/<serial>/numbers.txt
+</fleet_layout>
+"""
+
+STATE_FILE = 'fleet_state.json'
+STEPS = ('extract', 'contacts', 'numbers')
+NUMBER_SECTIONS = ('calls', 'voicemail', 'sms_inbox', 'sms_sent')
+
+_unsafe = re.compile(r'[^A-Za-z0-9._-]')
+
+def list_devices():
+    """{serial: state} from `adb devices`"""
+    output = subprocess.run([ADB, 'devices'], capture_output=True, text=True, check=True).stdout
+    devices = {}
+    for line in output.splitlines():
+        if line.startswith('List of devices') or line.startswith('*') or not line.strip():
+            continue
+        serial, _, state = line.partition('\t')
+        devices[serial.strip()] = state.strip() or 'unknown'
+    return devices
+
+def device_dir(outdir, serial):
+    return os.path.join(outdir, _unsafe.sub('_', serial))  # emulator-5554, 10.0.0.2:5555
+
+class FleetState:
+    """fleet_state.json: {serial: {step: finish time, 'error': last failure}}, saved on every change"""
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.devices = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.devices = json.load(f)
+
+    def done(self, serial, step):
+        return step in self.devices.get(serial, {})
+
+    def update(self, serial, **changes):
+        with self.lock:
+            entry = self.devices.setdefault(serial, {})
+            for key, value in changes.items():
+                if value is None: entry.pop(key, None)
+                else: entry[key] = value
+            with open(self.path + '.tmp', 'w') as f:
+                json.dump(self.devices, f, indent=2)
+            os.replace(self.path + '.tmp', self.path)
+
+    def reset(self, serial):
+        self.update(serial, **{step: None for step in STEPS})
+
+def device_numbers(datadir):
+    """Keys of every number in a device's extract dataset"""
+    keys = set()
+    for name in NUMBER_SECTIONS:
+        parser = RowParser()
+        rows = ('\n'.join(row) for row in iter_row_lines(iter_lines(os.path.join(datadir, f'{name}.lines'))))
+        for row in with_learned_columns(rows, parser):
+            fields = parser(row)
+            key = number_key(fields.get('address') or fields.get('number'))  # as split.parse_record
+            if key is not None:
+                keys.add(key)
+    return keys
+
+def run_device(serial, outdir, state, since):
+    """Run the remaining steps for one device; returns its number keys"""
+    ddir = device_dir(outdir, serial)
+    os.makedirs(ddir, exist_ok=True)
+    datadir = os.path.join(ddir, 'data')
+    numbers_path = os.path.join(ddir, 'numbers.txt')
+    if not state.done(serial, 'extract'):
+        counts = extract_dump(os.path.join(ddir, 'phone_records.json'), serial, datadir, since)
+        state.update(serial, extract=time.time())
+        print(f"[{serial}] {', '.join(f'{name}: {count}' for name, count in counts.items())} new records")
+    if not state.done(serial, 'contacts'):
+        count = extract_contacts(os.path.join(ddir, 'contacts.jsonl'), serial)
+        state.update(serial, contacts=time.time())
+        print(f"[{serial}] {count} contacts")
+    if not state.done(serial, 'numbers') or not os.path.exists(numbers_path):
+        keys = device_numbers(datadir)
+        with open(numbers_path, 'w') as f:
+            for key in sorted(keys):
+                f.write(format_number(key) + '\n')
+        state.update(serial, numbers=time.time())
+        return keys
+    with open(numbers_path) as f:
+        return {number_key(line.strip()) for line in f}
+
+def process_device(serial, outdir, state, since):
+    try:
+        keys = run_device(serial, outdir, state, since)
+    except (AdbError, OSError, subprocess.SubprocessError) as e:
+        # Disconnected or adb died: the extract checkpoint only advances after a full
+        # pull, so the next run resumes this device from its last good state
+        state.update(serial, error=f'{type(e).__name__}: {e}')
+        metrics.inc('fleet_devices', status='failed')
+        print(f"[{serial}] failed: {e}")
+        return serial, None
+    state.update(serial, error=None)
+    metrics.inc('fleet_devices', status='done')
+    return serial, keys
+
+def write_batch(path, keys, store_path=None):
+    """Write the keys the carrier store doesn't know yet; returns how many"""
+    store = CarrierStore(store_path) if store_path and os.path.exists(store_path) else None
+    try:
+        pending = sorted(key for key in keys if store is None or not store.get(key))
+    finally:
+        if store is not None: store.close()
+    with open(path, 'w') as f:
+        for key in pending:
+            f.write(format_number(key) + '\n')
+    return len(pending)
+
+def run_fleet(outdir, serials=None, workers=4, since=None, refresh=False, store_path='numbers.dat'):
+    """Extract every ready device; returns ({serial: keys or None if it failed}, batch size)"""
+    os.makedirs(outdir, exist_ok=True)
+    state = FleetState(os.path.join(outdir, STATE_FILE))
+    devices = list_devices()
+    for serial, device_state in devices.items():
+        if device_state != 'device':
+            print(f"[{serial}] skipped: {device_state}")
+    ready = [serial for serial, device_state in devices.items()
+             if device_state == 'device' and (not serials or serial in serials)]
+    for serial in serials or ():
+        if serial not in devices:
+            print(f"[{serial}] not connected")
+    if refresh:
+        for serial in ready:
+            state.reset(serial)
+
+    results = {}
+    with metrics.stage('fleet'), ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(process_device, serial, outdir, state, since) for serial in ready]
+        for future in as_completed(futures):
+            serial, keys = future.result()
+            results[serial] = keys
+
+    # Numbers from every device that has finished, this run or an earlier one
+    keys = set()
+    for serial in state.devices:
+        numbers_path = os.path.join(device_dir(outdir, serial), 'numbers.txt')
+        if serial in results and results[serial] is not None:
+            keys |= results[serial]
+        elif state.done(serial, 'numbers') and os.path.exists(numbers_path):
+            keys.update(number_key(line.strip()) for line in iter_lines(numbers_path))
+    keys.discard(None)
+    batch = write_batch(os.path.join(outdir, 'new_numbers.txt'), keys, store_path)
+    return results, batch
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Extract records and contacts from every attached device")
+    parser.add_argument('--serial', action='append', help="only these devices (repeatable)")
+    parser.add_argument('-o', '--outdir', default='fleet')
+    parser.add_argument('--workers', type=int, default=4, help="devices extracted at once")
+    parser.add_argument('--since-days', type=int, default=3*365,
+                        help="how far back a device's first pull goes")
+    parser.add_argument('--refresh', action='store_true',
+                        help="pull new rows from devices that already finished")
+    parser.add_argument('--store', default='numbers.dat', help="carrier store for the lookup batch")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    start = time.time()
+    since = int((datetime.now() - timedelta(days=args.since_days)).timestamp() * 1000)
+    results, batch = run_fleet(args.outdir, args.serial, args.workers, since, args.refresh, args.store)
+
+    failed = sorted(serial for serial, keys in results.items() if keys is None)
+    print(f"\nFleet run complete in {time.time() - start:.1f}s: "
+          f"{len(results) - len(failed)} devices done, {len(failed)} failed")
+    if failed:
+        print(f"Failed (rerun to resume): {', '.join(failed)}")
+    print(f"{batch} new numbers to look up in {os.path.join(args.outdir, 'new_numbers.txt')}")
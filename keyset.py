@@ -0,0 +1,94 @@
+import mmap, os, struct, sys, threading
+from array import array
+from bisect import bisect_left
+
+"""
+🤔 Membership file for number keys (contacts):
+- A sorted uint64 array of phone.number_key values behind a small header, memory-mapped
+  on open, so loading is O(1) however much metadata the contacts file carries
+- Membership is a bisect over the mmap'd array (~20 probes for a million keys); pages
+  are shared through the page cache by every process and device run using the file
+- Answers are memoized per queried key: call logs repeat the same numbers, so memory
+  follows the distinct numbers classified, not the size of the contact list
+- Written next to the JSON it came from (contacts.jsonl -> contacts.bin) and rebuilt
+  when the JSON is newer, the same way the carrier store keeps numbers.dat.idx
+<keyset_format>
+  header: magic, count
+  keys:   count x uint64, ascending, no duplicates
+</keyset_format>
+"""
+
+MAGIC = b'TCPAKEY1'
+HEADER = struct.Struct('<8sQ')
+
+def keyset_path(path):
+    return os.path.splitext(path)[0] + '.bin'
+
+def write_keyset(path, keys):
+    """Write the distinct keys sorted; returns how many"""
+    keys = sorted(set(keys))
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'  # one per writer
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, len(keys)))
+            f.write(array('Q', keys).tobytes())  # native byte order, matching the cast on open
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return len(keys)
+
+def is_fresh(path, source=None):
+    """True if path is a keyset at least as new as source"""
+    if not os.path.exists(path): return False
+    if source and os.path.exists(source) and os.path.getmtime(source) > os.path.getmtime(path):
+        return False
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+class MappedKeySet:
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = HEADER.unpack_from(self._mm)
+        if magic != MAGIC:
+            self._mm.close()
+            raise ValueError(f"{path} is not a keyset file")
+        self.keys = memoryview(self._mm)[HEADER.size:HEADER.size + self.count * 8].cast('Q')
+        self._seen = {}
+
+    def __contains__(self, key):
+        found = self._seen.get(key)
+        if found is None:
+            found = self._seen[key] = self._search(key)
+        return found
+
+    def _search(self, key):
+        if key is None: return False
+        i = bisect_left(self.keys, key)
+        return i < self.count and self.keys[i] == key
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return iter(self.keys)
+
+    def close(self):
+        if self._mm is None: return
+        self.keys.release()
+        self._mm.close()
+        self._mm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+if __name__ == '__main__':
+    # Migration: python keyset.py contacts.json -> contacts.bin (contacts.py writes .jsonl + .bin)
+    from spam import read_contact_keys
+    source = sys.argv[1] if len(sys.argv) > 1 else 'contacts.json'
+    print(f"Wrote {write_keyset(keyset_path(source), read_contact_keys(source))} keys to {keyset_path(source)}")
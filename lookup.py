@@ -0,0 +1,155 @@
+import time, random, threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+"""
+🤔 Lookup engine design:
+- One pooled keep-alive Session shared by a thread pool (requests releases the GIL on I/O)
+- Token bucket caps requests/sec across all workers, so we stay under the API quota
+- 429/5xx and connection errors retry with exponential backoff (+ Retry-After if sent)
+- Results go into the lookup cache (and so the carrier store) from the main thread as
+  they complete, so a crash loses at most the lookups still in flight
+- A missing 'Response' is cached negatively; transport failures and malformed replies
+  (not a JSON object, or a 'Response' that isn't one) are counted as failed, not cached
+"""
+
+API_URL = 'http://www.carrierlookup.com/api/lookup'
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class BadResponse(ValueError):
+    """The API replied with something other than {"Response": {...}}"""
+
+class TokenBucket:
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_for = (1 - self.tokens) / self.rate
+            time.sleep(wait_for)
+
+def make_session(pool_size):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def backoff_delay(attempt, backoff, res=None):
+    retry_after = res.headers.get('Retry-After') if res is not None else None
+    if retry_after and retry_after.isdigit():
+        return float(retry_after)
+    return backoff * (2 ** attempt) * (0.5 + random.random())
+
+def lookup_number(session, number, key, url=API_URL, bucket=None,
+                  retries=5, backoff=0.5, timeout=10):
+    """Return the API's 'Response' dict for number (None if the API has none)"""
+    for attempt in range(retries + 1):
+        if bucket: bucket.acquire()
+        start = time.perf_counter()
+        try:
+            res = session.get(url, params={'key': key, 'number': number}, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout):
+            metrics.inc('api_requests', status='error')
+            if attempt == retries: raise
+            time.sleep(backoff_delay(attempt, backoff))
+            continue
+        metrics.observe('api_latency_seconds', time.perf_counter() - start)
+        metrics.inc('api_requests', status=res.status_code)
+        if res.status_code in RETRY_STATUSES and attempt < retries:
+            time.sleep(backoff_delay(attempt, backoff, res))
+            continue
+        res.raise_for_status()
+        return parse_response(res)
+
+def parse_response(res):
+    try:
+        body = res.json()
+    except ValueError as e:
+        raise BadResponse(f"invalid JSON: {e}") from None
+    if not isinstance(body, dict):
+        raise BadResponse(f"expected a JSON object, got {type(body).__name__}")
+    response = body.get('Response')
+    if response and not isinstance(response, dict):
+        raise BadResponse(f"unexpected Response: {str(response)[:80]!r}")
+    return response
+
+def lookup_all(numbers, cache, key, url=API_URL, workers=8, rate=None,
+               retries=5, backoff=0.5, report_every=10.0):
+    """Look up numbers concurrently, putting each result in cache as it completes.
+
+    Returns (carrier Counter, stats Counter). Numbers whose lookup fails (transport
+    errors, malformed replies) are counted in stats and not cached.
+    """
+    bucket = TokenBucket(rate) if rate else None
+    session = make_session(workers)
+    carriers, stats = Counter(), Counter()
+    numbers = iter(numbers)
+    start = last_report = time.monotonic()
+
+    def report(final=False):
+        elapsed = time.monotonic() - start
+        done = stats['ok'] + stats['failed'] + stats['no_response']
+        rate_now = done / elapsed if elapsed else 0.0
+        print(f"{'Finished' if final else 'Progress'}: {done} lookups "
+              f"({stats['failed']} failed, {stats['no_response']} without response) "
+              f"in {elapsed:.1f}s - {rate_now:.1f} lookups/sec")
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        in_flight = {}
+
+        def submit_next():
+            number = next(numbers, None)
+            if number is None: return False
+            future = pool.submit(lookup_number, session, number, key, url,
+                                 bucket, retries, backoff)
+            in_flight[future] = number
+            return True
+
+        # Keep a bounded window in flight so huge inputs don't queue up in memory
+        while len(in_flight) < workers * 2 and submit_next():
+            pass
+
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                number = in_flight.pop(future)
+                try:
+                    response = future.result()
+                except (requests.RequestException, BadResponse) as e:
+                    print(f"Lookup failed for {number}: {e}")
+                    stats['failed'] += 1
+                else:
+                    record = cache.put(number, response)
+                    if not response:
+                        stats['no_response'] += 1
+                    else:
+                        carriers[record.get('carrier')] += 1
+                        stats['ok'] += 1
+                submit_next()
+
+            if report_every and time.monotonic() - last_report >= report_every:
+                last_report = time.monotonic()
+                report()
+
+    session.close()
+    for result, count in stats.items():
+        metrics.inc('lookups', count, result=result)
+    report(final=True)
+    return carriers, stats
@@ -0,0 +1,94 @@
+import time
+from collections import OrderedDict
+
+from carrier_store import NEGATIVE
+from phone import number_key
+
+"""
+🤔 Cache in front of the carrier API:
+- Hot tier: an LRU-bounded OrderedDict of recently used entries
+- Disk tier: the carrier store (numbers.dat + index), which records each lookup's time
+- Entries older than ttl are stale and get looked up again, so ported numbers refresh
+- Numbers the API has no data for are cached negatively with a shorter ttl instead of
+  being retried on every run; an empty refresh of a number with known carrier data
+  keeps the data
+- Entries from before lookup times were recorded (ts=0) count as fresh
+"""
+
+DAY = 24 * 60 * 60
+DEFAULT_TTL = 180 * DAY
+DEFAULT_NEGATIVE_TTL = 7 * DAY
+DEFAULT_HOT_SIZE = 100000
+
+class LookupCache:
+    def __init__(self, store, ttl=DEFAULT_TTL, negative_ttl=DEFAULT_NEGATIVE_TTL,
+                 hot_size=DEFAULT_HOT_SIZE, clock=time.time):
+        self.store = store
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hot_size = hot_size
+        self.clock = clock
+        self.hot = OrderedDict()
+
+    def _entry(self, key):
+        if key in self.hot:
+            self.hot.move_to_end(key)
+            return self.hot[key]
+        values = self.store.lookup(key)
+        if values is not None:
+            self._remember(key, values)
+        return values
+
+    def _remember(self, key, values):
+        self.hot[key] = values
+        self.hot.move_to_end(key)
+        if len(self.hot) > self.hot_size:
+            self.hot.popitem(last=False)
+
+    def _status(self, number):
+        """(status, store values or None)"""
+        key = number_key(number)
+        if key is None: return 'miss', None
+        values = self._entry(key)
+        if values is None: return 'miss', None
+        _, _, ts, negative = values
+        ttl = self.negative_ttl if negative else self.ttl
+        if ts and self.clock() - ts > ttl:
+            return 'stale', values
+        return 'negative' if negative else 'hit', values
+
+    def status(self, number):
+        """'hit', 'negative' (fresh negative entry), 'stale' or 'miss'"""
+        return self._status(number)[0]
+
+    def needs_lookup(self, number):
+        return self.status(number) in ('miss', 'stale')
+
+    def get(self, number):
+        """Fresh carrier data for number, or None"""
+        status, values = self._status(number)
+        if status != 'hit': return None
+        carrier, carrier_type, _, _ = values
+        return {'carrier': carrier, 'carrier_type': carrier_type}
+
+    def put(self, number, response):
+        """Record an API response (None = no data) in both tiers; returns the stored record
+
+        An empty answer for a number we already have carrier data for keeps that data
+        (only its time is refreshed) rather than caching it negatively.
+        """
+        ts = int(self.clock())
+        key = number_key(number)
+        known = self._entry(key) if key is not None and not response else None
+        if response:
+            record = {'carrier_type': response.get('carrier_type'),
+                      'carrier': response.get('carrier'),
+                      'number': number, 'ts': ts}
+        elif known is not None and not known[3]:
+            record = {'carrier_type': known[1], 'carrier': known[0], 'number': number, 'ts': ts}
+        else:
+            record = {'number': number, 'status': NEGATIVE, 'ts': ts}
+        self.store.add(record)
+        if key is not None:
+            self._remember(key, self.store.lookup(key))
+        return record
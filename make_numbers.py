@@ -1,30 +1,62 @@
-import requests, sys, json, random
-import config
+import argparse
 from collections import Counter
+import metrics
+from carrier_store import CarrierStore
+from lookup_cache import DAY, DEFAULT_HOT_SIZE, DEFAULT_NEGATIVE_TTL, DEFAULT_TTL, LookupCache
+from phone import format_number, number_key
 
-numbers = {}
-_counter = Counter()
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Look up carriers for new numbers")
+    parser.add_argument('infile', help="file with one number per line (e.g. new_numbers.txt)")
+    parser.add_argument('--store', default='numbers.dat', help="carrier store log")
+    parser.add_argument('--workers', type=int, default=8, help="lookups in flight")
+    parser.add_argument('--rate', type=float, default=None, help="max lookups/sec")
+    parser.add_argument('--retries', type=int, default=5)
+    parser.add_argument('--url', help="lookup endpoint (default: lookup.API_URL)")
+    parser.add_argument('--ttl-days', type=float, default=DEFAULT_TTL / DAY,
+                        help="refresh carrier data older than this")
+    parser.add_argument('--negative-ttl-days', type=float, default=DEFAULT_NEGATIVE_TTL / DAY,
+                        help="retry numbers the API had no data for after this")
+    parser.add_argument('--hot-size', type=int, default=DEFAULT_HOT_SIZE,
+                        help="entries kept in the in-memory cache tier")
+    return parser.parse_args(argv)
 
-if __name__ == "__main__":
-    with open('numbers.dat') as fin:
-        for line in fin:
-            line = json.loads(line.rstrip())
-            number = line.get('number')
-            numbers[number] = line
+def main(argv=None, open_carriers=CarrierStore):
+    """Look up uncached numbers; config and lookup (requests) are only imported if any are"""
+    args = parse_args(argv)
+
+    store = open_carriers(args.store)
+    try:
+        with metrics.stage('lookup'):
+            cache = LookupCache(store, ttl=args.ttl_days * DAY,
+                                negative_ttl=args.negative_ttl_days * DAY, hot_size=args.hot_size)
+            pending, seen, statuses = [], set(), Counter()
+            with open(args.infile) as f:
+                for line in f:
+                    key = number_key(line.strip())
+                    if key is None or key in seen: continue
+                    seen.add(key)
+                    status = cache.status(key)
+                    statuses[status] += 1
+                    if status in ('miss', 'stale'):
+                        pending.append(format_number(key))
+            for status, count in statuses.items():
+                metrics.inc('lookup_cache', count, status=status)
+            print(f"Cached: {statuses['hit']} known, {statuses['negative']} known invalid; "
+                  f"looking up {statuses['miss']} new and {statuses['stale']} stale numbers")
+            if not pending:
+                return Counter()
 
-    with open('numbers.dat', 'a') as fout:
-        with open(sys.argv[1]) as f:
-            for line in f:
-                line = line.rstrip()
-                if not numbers.get(line):
-                    res = requests.get('http://www.carrierlookup.com/api/lookup?key=%s&number=%s' % (config.CL_key, line))
-                    res = res.json()
-                    res = res.get('Response')
-                    record = {'carrier_type': res.get('carrier_type'), 'carrier' : res.get('carrier'), 'number' : line}
-                    numbers[line] = record
-                    fout.write(json.dumps(record)+'\n') 
-                    _counter[record.get('carrier')] += 1
-                    if random.random() < 0.1: print(_counter)
-                else:
-                    print('skipped %s' % line)
+            import config
+            from lookup import API_URL, lookup_all
+            _counter, stats = lookup_all(pending, cache, config.CL_key, url=args.url or API_URL,
+                                         workers=args.workers, rate=args.rate,
+                                         retries=args.retries)
+    finally:
+        if open_carriers is CarrierStore:
+            store.close()  # a shared store (tcpa chains) stays open for the next step
     print(_counter)
+    return _counter
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+import argparse, hashlib, json, os, re, sqlite3, time
+from extract import PROVIDERS, write_sections
+from keyset import keyset_path, write_keyset
+from phone import format_number, number_key
+from records import assemble_rows, iter_sections
+
+"""
+🤔 One consolidated dataset out of hundreds of overlapping dumps:
+- An SQLite index (merged.db) holds every distinct row once, keyed by a 64-bit hash
+  of (provider, _id, date, number key); SQLite keeps the index on disk, so the merge
+  needs no memory proportional to the history
+- A dump is streamed and its rows are INSERT OR IGNOREd, one transaction per dump;
+  the dump's path/size/mtime are recorded with it, so re-running over the same
+  directory only reads dumps that are new or changed: cost is O(new rows)
+- Rows are whole (a `Row:` line plus continuation lines) and stored verbatim, so the
+  consolidated dump is a plain phone_records_*.json split.py/spam.py/parse.py read
+- Output is streamed from an index on (provider, date, _id): sorted without a sort step
+- contacts_*.jsonl (and the older contacts_*.json) are merged by number key too, a
+  non-empty name winning, into one contacts.jsonl plus its .bin keyset
+<merge_db>
+  rows(hash PK, provider, date, id, raw)     index (provider, date, id)
+  contacts(key PK, number, name, raw_number, source)
+  inputs(path PK, size, mtime, rows, added, ingested)
+</merge_db>
+"""
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS rows (hash INTEGER PRIMARY KEY, provider TEXT, date INTEGER, id INTEGER, raw TEXT);
+CREATE INDEX IF NOT EXISTS rows_order ON rows (provider, date, id);
+CREATE TABLE IF NOT EXISTS contacts (key INTEGER PRIMARY KEY, number TEXT, name TEXT, raw_number TEXT, source TEXT);
+CREATE TABLE IF NOT EXISTS inputs (path TEXT PRIMARY KEY, size INTEGER, mtime REAL, rows INTEGER,
+                                   added INTEGER, ingested REAL);
+'''
+
+_id_field = re.compile(r'(?:^|\s|, )_id=(\d+)')
+_date_field = re.compile(r', date=(\d+)')
+_number_field = re.compile(r'(?:^|, |\s)(?:number|address)=([^,\n]*)')
+
+def open_db(path):
+    db = sqlite3.connect(path)
+    db.execute('PRAGMA journal_mode=WAL')
+    db.execute('PRAGMA synchronous=NORMAL')
+    db.executescript(SCHEMA)
+    return db
+
+def field(pattern, row):
+    m = pattern.search(row)
+    return m.group(1) if m else None
+
+def row_hash(provider, row_id, date, key, row):
+    """Signed 64-bit digest of the dedup fields (the whole row if it has no _id/date)"""
+    text = f'{provider}\0{row_id}\0{date}\0{key}' if row_id or date else f'{provider}\0{row}'
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), 'big', signed=True)
+
+def iter_dump_rows(path):
+    """Yield (hash, provider, date, _id, row) for every row of a dump"""
+    for provider, lines in iter_sections(path):
+        for row in assemble_rows(lines):
+            head = row.split('\n', 1)[0]
+            row_id, date = field(_id_field, head), field(_date_field, head)
+            key = number_key(field(_number_field, head))
+            yield (row_hash(provider, row_id, date, key, row), provider,
+                   int(date) if date else None, int(row_id) if row_id else None, row)
+
+def iter_contacts(path):
+    """Yield (key, number, name, raw_number, source) from a contacts .jsonl or legacy .json"""
+    with open(path) as f:
+        if path.endswith('.jsonl'):
+            contacts = (json.loads(line) for line in f if line.strip())
+        else:  # {number: {'name': ..., 'raw_number': ...}}
+            contacts = ({'number': number, **fields} for number, fields in json.load(f).items())
+        for contact in contacts:
+            key = number_key(contact.get('number'))
+            if key is not None:
+                yield (key, format_number(key), contact.get('name') or '',
+                       contact.get('raw_number') or contact['number'], contact.get('source') or path)
+
+def is_contacts_file(path):
+    return os.path.basename(path).startswith('contacts')
+
+def ingest(db, path):
+    """Merge one dump or contacts file; returns (rows read, rows added), None if already merged"""
+    stat = os.stat(path)
+    path = os.path.abspath(path)
+    seen = db.execute('SELECT size, mtime FROM inputs WHERE path = ?', (path,)).fetchone()
+    if seen == (stat.st_size, stat.st_mtime):
+        return None
+    with db:  # one transaction: a dump is either fully merged and recorded, or not at all
+        before = db.total_changes
+        if is_contacts_file(path):
+            rows = list(iter_contacts(path))
+            db.executemany('''INSERT INTO contacts VALUES (?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE
+                              SET name = excluded.name, raw_number = excluded.raw_number, source = excluded.source
+                              WHERE excluded.name != '' AND excluded.name != contacts.name''', rows)
+            read = len(rows)
+        else:
+            counter = [0]
+            def counted(rows):
+                for row in rows:
+                    counter[0] += 1
+                    yield row
+            db.executemany('INSERT OR IGNORE INTO rows VALUES (?, ?, ?, ?, ?)', counted(iter_dump_rows(path)))
+            read = counter[0]
+        added = db.total_changes - before
+        db.execute('INSERT OR REPLACE INTO inputs VALUES (?, ?, ?, ?, ?, ?)',
+                   (path, stat.st_size, stat.st_mtime, read, added, time.time()))
+    return read, added
+
+def iter_merged_lines(db, provider):
+    """A provider's rows in (date, _id) order, split back into raw lines"""
+    for raw, in db.execute('SELECT raw FROM rows WHERE provider = ? ORDER BY date, id', (provider,)):
+        yield from raw.split('\n')
+
+def write_merged(db, filename):
+    """Write the consolidated dump; returns {provider: rows}"""
+    providers = list(PROVIDERS) + [provider for provider, in db.execute('SELECT DISTINCT provider FROM rows')
+                                   if provider not in PROVIDERS]
+    write_sections(filename, {provider: iter_merged_lines(db, provider) for provider in providers})
+    return dict(db.execute('SELECT provider, COUNT(*) FROM rows GROUP BY provider'))
+
+def write_contacts(db, filename):
+    """Write the merged contacts as contacts.jsonl plus its keyset; returns how many"""
+    keys = []
+    with open(filename, 'w') as out:
+        for key, number, name, raw_number, source in db.execute('SELECT * FROM contacts ORDER BY key'):
+            out.write(json.dumps({'number': number, 'name': name, 'raw_number': raw_number,
+                                  'source': source}) + '\n')
+            keys.append(key)
+    write_keyset(keyset_path(filename), keys)
+    return len(keys)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Merge extraction dumps and contacts into one deduplicated dataset")
+    parser.add_argument('inputs', nargs='*', help="phone_records_*.json and contacts_*.jsonl/.json files")
+    parser.add_argument('--db', default='merged.db', help="merge index (kept between runs)")
+    parser.add_argument('-o', '--output', default='phone_records_merged.json')
+    parser.add_argument('--contacts', default='contacts.jsonl', help="merged contacts output")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    start = time.time()
+    db = open_db(args.db)
+    try:
+        skipped = 0
+        for path in args.inputs:
+            result = ingest(db, path)
+            if result is None:
+                skipped += 1
+                continue
+            read, added = result
+            print(f"{path}: {read} rows, {added} new")
+        if skipped:
+            print(f"{skipped} inputs already merged")
+
+        counts = write_merged(db, args.output)
+        contacts = write_contacts(db, args.contacts) if db.execute('SELECT 1 FROM contacts LIMIT 1').fetchone() else 0
+    finally:
+        db.close()
+
+    print(f"\nMerged in {time.time() - start:.1f}s: "
+          + ', '.join(f"{provider}: {count}" for provider, count in counts.items()))
+    print(f"Data saved to {args.output}" + (f", {contacts} contacts to {args.contacts}" if contacts else ''))
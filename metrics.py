@@ -0,0 +1,206 @@
+import atexit, json, os, signal, sys, threading, time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+"""
+🤔 Shared instrumentation, configured from the environment so production runs can be
+inspected without editing code:
+- TCPA_METRICS=path   write metrics at exit: Prometheus text if path ends in .prom
+                      (rewritten atomically, for a node_exporter textfile collector),
+                      otherwise appended as JSON lines. `{script}` in the path is
+                      replaced with the script name, e.g. /var/lib/tcpa/{script}.prom
+- TCPA_PROFILE=cprofile|sample   profile every stage() block; cProfile writes
+                      profile_{stage}.prof (pstats/snakeviz), the sampler writes
+                      profile_{stage}.folded stacks (flamegraph.pl / speedscope);
+                      it samples on wall time, so waits on adb/the API show up too
+- TCPA_PROFILE_DIR    where profiles go (default: current directory)
+- TCPA_PROFILE_INTERVAL   sampling period in seconds (default 0.005)
+Metrics are always collected (cheap, lock-protected for the lookup threads) and only
+written when TCPA_METRICS is set; hot loops record per batch or per file, not per row.
+Histograms use fixed log-spaced buckets, so percentiles are bucket estimates and
+memory stays constant however many observations arrive.
+"""
+
+PREFIX = 'tcpa_'
+# 0.5ms .. ~9 minutes, four buckets per doubling
+BUCKETS = [0.0005 * 2 ** (i / 4) for i in range(81)]
+QUANTILES = (0.5, 0.9, 0.99)
+
+def label_key(labels):
+    return tuple(sorted(labels.items()))
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        lo, hi = 0, len(self.buckets)
+        while lo < hi:  # first bucket with bound >= value
+            mid = (lo + hi) // 2
+            if self.buckets[mid] < value: lo = mid + 1
+            else: hi = mid
+        self.counts[lo] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Estimate by linear interpolation inside the bucket holding the q-th observation"""
+        if not self.count: return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(self.max, lower + (upper - lower) * (rank - seen) / n)
+            seen += n
+        return self.max
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = defaultdict(Counter)      # name -> {label key: value}
+        self.histograms = defaultdict(dict)       # name -> {label key: Histogram}
+
+    def inc(self, name, value=1, **labels):
+        with self.lock:
+            self.counters[name][label_key(labels)] += value
+
+    def observe(self, name, value, **labels):
+        key = label_key(labels)
+        with self.lock:
+            histogram = self.histograms[name].get(key)
+            if histogram is None:
+                histogram = self.histograms[name][key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Observe the block's wall time (seconds) into histogram name"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def json_lines(self, script):
+        ts = time.time()
+        base = {'ts': round(ts, 3), 'script': script, 'pid': os.getpid()}
+        with self.lock:
+            for name, series in sorted(self.counters.items()):
+                for key, value in series.items():
+                    yield json.dumps({**base, 'metric': PREFIX + name, 'type': 'counter',
+                                      'labels': dict(key), 'value': value})
+            for name, series in sorted(self.histograms.items()):
+                for key, h in series.items():
+                    summary = {f'p{round(q * 100)}': round(h.quantile(q), 6) for q in QUANTILES}
+                    yield json.dumps({**base, 'metric': PREFIX + name, 'type': 'histogram',
+                                      'labels': dict(key), 'count': h.count, 'sum': round(h.sum, 6),
+                                      'max': round(h.max, 6), **summary})
+
+    def prometheus(self, script):
+        def fmt(labels):
+            labels = {'script': script, **labels}
+            return '{' + ','.join(f'{k}="{v}"' for k, v in sorted(labels.items())) + '}'
+        lines = []
+        with self.lock:
+            for name, series in sorted(self.counters.items()):
+                lines.append(f'# TYPE {PREFIX}{name} counter')
+                lines += [f'{PREFIX}{name}{fmt(dict(key))} {value}' for key, value in series.items()]
+            for name, series in sorted(self.histograms.items()):
+                lines.append(f'# TYPE {PREFIX}{name} histogram')
+                for key, h in series.items():
+                    cumulative = 0
+                    for bound, n in zip(h.buckets + ['+Inf'], h.counts):
+                        cumulative += n
+                        le = bound if bound == '+Inf' else f'{bound:.6g}'
+                        lines.append(f'{PREFIX}{name}_bucket{fmt({**dict(key), "le": le})} {cumulative}')
+                    lines.append(f'{PREFIX}{name}_sum{fmt(dict(key))} {h.sum:.6f}')
+                    lines.append(f'{PREFIX}{name}_count{fmt(dict(key))} {h.count}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path, script):
+        path = path.replace('{script}', script)
+        if path.endswith('.prom'):
+            with open(path + '.tmp', 'w') as f:
+                f.write(self.prometheus(script))
+            os.replace(path + '.tmp', path)
+        else:
+            with open(path, 'a') as f:
+                for line in self.json_lines(script):
+                    f.write(line + '\n')
+
+REGISTRY = Registry()
+inc = REGISTRY.inc
+observe = REGISTRY.observe
+timer = REGISTRY.timer
+
+def script_name():
+    return os.path.splitext(os.path.basename(sys.argv[0] or 'python'))[0] or 'python'
+
+def emit():
+    path = os.environ.get('TCPA_METRICS')
+    if path:
+        REGISTRY.write(path, script_name())
+
+if os.environ.get('TCPA_METRICS'):
+    atexit.register(emit)
+
+class SamplingProfiler:
+    """Collects folded stacks of every thread on a wall-clock interval timer (main thread only)"""
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+
+    def _sample(self, signum, frame):
+        frames = sys._current_frames()
+        frames[threading.main_thread().ident] = frame  # the interrupted frame, not this handler
+        for thread_frame in frames.values():
+            stack = []
+            while thread_frame is not None:
+                code = thread_frame.f_code
+                stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+                thread_frame = thread_frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self.previous = signal.signal(signal.SIGALRM, self._sample)
+        signal.setitimer(signal.ITIMER_REAL, self.interval, self.interval)
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, self.previous)
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+
+@contextmanager
+def stage(name):
+    """Time a pipeline stage into stage_seconds{stage=name}, profiling it if TCPA_PROFILE is set"""
+    mode = os.environ.get('TCPA_PROFILE')
+    profile_dir = os.environ.get('TCPA_PROFILE_DIR', '.')
+    profiler = None
+    if mode == 'cprofile':
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    elif mode == 'sample' and threading.current_thread() is threading.main_thread():
+        profiler = SamplingProfiler(float(os.environ.get('TCPA_PROFILE_INTERVAL', 0.005)))
+        profiler.start()
+    try:
+        with timer('stage_seconds', stage=name):
+            yield
+    finally:
+        if mode == 'cprofile':
+            profiler.disable()
+            profiler.dump_stats(os.path.join(profile_dir, f'profile_{name}.prof'))
+        elif profiler is not None:
+            profiler.stop()
+            profiler.write(os.path.join(profile_dir, f'profile_{name}.folded'))
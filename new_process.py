@@ -1,16 +1,14 @@
-import sys, json
+import sys
+from records import RowParser, iter_records
 
 if __name__ == "__main__":
-    with open(sys.argv[1], 'r') as f:
-        d = json.load(f)
-    calls, voicemails, sms = d.get('calls'), d.get('voicemails'), d.get('sms_inbox')
-    
-    for call in calls:
-        print(call.split(','))
-        _c = {c.split('=')[0]:c.split('=')[1] for c in call.split(',')}
-        
-        print(_c.keys())
-        #input()
+    parse_call = RowParser()
+    for record_type, record in iter_records(sys.argv[1], {'calls', 'voicemail'}):
+        if record_type == 'calls':
+            print(record.split(','))
+            _c = parse_call(record)
 
-    for vm in voicemails:
-        print(type(vm))
+            print(_c.keys())
+            #input()
+        else:
+            print(type(record))
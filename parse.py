@@ -1,62 +1,102 @@
-import json, csv, sys
-from collections import defaultdict, Counter
+import csv, os, sys
+from collections import Counter, defaultdict
+from records import SECTIONS, RowParser, assemble_rows, iter_sections, split_fields, with_learned_columns
+from sketches import FieldStats
 
 """
 🤔 Keeping it simple:
-- Take filename from sys.argv[1]
+- Take filename from sys.argv[1] (or main's argv)
 - Parse content query format
-- Count field occurrences 
+- Count field occurrences
 - Write to CSVs
 <flow>
-input.json -> parse -> count -> output CSVs
+input.json -> stream -> parse once -> sketch stats + spool CSV rows -> output CSVs
 </flow>
+- One pass: each row (continuation lines and voicemail payloads reassembled) is parsed
+  once, counted and written straight away
+- Per-field stats are bounded sketches (top-k + distinct), exact for low-cardinality
+  fields, so memory doesn't grow with date/_id/body
+- Rows are spooled in field discovery order; the header is only known at the end, so
+  finalizing rewrites the spool with the sorted header (no re-parsing)
 """
 
-def parse_line(line):
-    return dict(p.split('=', 1) for p in line.split(',') if '=' in p)
+TOP_K = 5
 
-def get_fields(records):
-    fields = set()
-    for record in records:
-        fields.update(parse_line(record).keys())
-    return sorted(list(fields))
+def parse_line(line, parser=split_fields):
+    return parser(line)
 
-def main():
-    if len(sys.argv) != 2:
+class SectionWriter:
+    """Streams parsed rows to {record_type}.csv.tmp, then finalizes with a sorted header"""
+    def __init__(self, record_type):
+        self.path = f"{record_type}.csv"
+        self.spool_path = self.path + '.tmp'
+        self.spool = open(self.spool_path, 'w', newline='')
+        self.writer = csv.writer(self.spool)
+        self.fields = {}  # field -> spool column, in discovery order
+        self.count = 0
+
+    def write(self, record):
+        for field in record:
+            if field not in self.fields:
+                self.fields[field] = len(self.fields)
+        row = [''] * len(self.fields)
+        for field, value in record.items():
+            row[self.fields[field]] = value
+        self.writer.writerow(row)
+        self.count += 1
+
+    def finalize(self):
+        self.spool.close()
+        header = sorted(self.fields)
+        columns = [self.fields[field] for field in header]
+        with open(self.spool_path, newline='') as spool, open(self.path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            for row in csv.reader(spool):
+                row += [''] * (len(self.fields) - len(row))
+                writer.writerow([row[i] for i in columns])
+        os.remove(self.spool_path)
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 1:
         print("Usage: python parse.py input.json")
         sys.exit(1)
 
-    with open(sys.argv[1]) as f:
-        data = json.load(f)
+    totals = Counter()
+    stats = defaultdict(lambda: defaultdict(FieldStats))
+    writers = {}
+    try:
+        for record_type, lines in iter_sections(argv[0], SECTIONS):
+            parser = RowParser()
+            for row in with_learned_columns(assemble_rows(lines, record_type == 'voicemail'), parser):
+                parsed = parse_line(row, parser)
+                totals[record_type] += 1
+                for field, value in parsed.items():
+                    stats[record_type][field].add(value)
+                if record_type not in writers:
+                    writers[record_type] = SectionWriter(record_type)
+                writers[record_type].write(parsed)
+    finally:
+        for writer in writers.values():
+            writer.finalize()
 
-    for record_type in ['calls', 'voicemail', 'sms_inbox', 'sms_sent']:
-        if record_type not in data or not data[record_type]:
+    for record_type in SECTIONS:
+        if not totals[record_type]:
             continue
-            
-        records = data[record_type]
-        fields = get_fields(records)
-        parsed = [parse_line(r) for r in records]
-        
+
         # Print stats
         print(f"\n{record_type}:")
-        print(f"Total records: {len(records)}")
-        
-        counts = defaultdict(Counter)
-        for record in parsed:
-            for field, value in record.items():
-                counts[field][value] += 1
-                
-        for field in fields:
-            print(f"\n{field} (top 5):")
-            for value, count in counts[field].most_common(5):
-                print(f"  {value}: {count}")
-        
-        # Write CSV
-        with open(f"{record_type}.csv", 'w', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=fields)
-            writer.writeheader()
-            writer.writerows(parsed)
-            print(f"\nWrote {len(parsed)} records to {record_type}.csv")
+        print(f"Total records: {totals[record_type]}")
+
+        for field, field_stats in sorted(stats[record_type].items()):
+            distinct = field_stats.distinct_count()
+            approx = '' if field_stats.exact else '~'
+            print(f"\n{field} (top {TOP_K}, {approx}{distinct} distinct):")
+            for value, count, error in field_stats.most_common(TOP_K):
+                print(f"  {value}: {count - error}-{count}" if error else f"  {value}: {count}")
+
+        print(f"\nWrote {totals[record_type]} records to {record_type}.csv")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,70 @@
+import re
+
+"""
+🤔 One canonical phone number representation for the whole pipeline:
+- number_key() turns any raw form (+1 (555) 123-4567, 15551234567, 5551234567, +44 20 ...)
+  into a 64-bit int: NANP numbers are their 10-digit value, anything else is its E.164
+  digits with the INTL bit set, so the two ranges can't collide
+- Sets and dicts (contacts, carrier store, counters, dedup) are keyed by that int:
+  smaller than strings and cheaper to hash, and every source normalizes the same way
+- Area code is arithmetic (key // 10**7) instead of string slicing; international
+  numbers have none
+- format_number() gives the string written to records and files: the 10-digit form
+  for NANP (what clean_number always produced), '+' and E.164 digits otherwise
+- Extensions (x123, ext. 4, ;ext=) are dropped; fewer than 10 digits (short codes,
+  garbage) has no key, as before
+- An int is taken as a key only if it is in key range (below 10**10, or INTL-tagged);
+  other ints (15551234567 from an int64 column) are normalized like their digits
+"""
+
+INTL = 1 << 62
+AREA_DIVISOR = 10 ** 7
+NANP_LIMIT = 10 ** 10
+INTL_LIMIT = 10 ** 15
+
+_non_digit = re.compile(r'\D')
+_extension = re.compile(r'\s*(?:ext|[x#;,]).*', re.IGNORECASE | re.DOTALL)
+
+def number_key(number):
+    """Canonical integer key for a raw number, or None"""
+    if number is None: return None
+    if isinstance(number, int):
+        if 0 <= number < NANP_LIMIT or INTL <= number < INTL | INTL_LIMIT:
+            return number  # already a key
+        number = str(number)  # e.g. 15551234567 from an int64 column: normalize like its string
+    number = str(number)
+    if len(number) == 10 and number.isascii() and number.isdigit():
+        return int(number)  # fast path: already canonical
+    number = _extension.sub('', number.strip())
+    digits = _non_digit.sub('', number)
+    if number.startswith('+'):
+        if len(digits) == 11 and digits[0] == '1':
+            return int(digits[1:])
+        return INTL | int(digits) if 7 <= len(digits) <= 15 else None
+    for exit_code in ('011', '00'):  # NANP / most-of-the-world international prefixes
+        if digits.startswith(exit_code) and 7 <= len(digits) - len(exit_code) <= 15:
+            digits = digits[len(exit_code):]
+            return int(digits[1:]) if len(digits) == 11 and digits[0] == '1' else INTL | int(digits)
+    if len(digits) == 10:
+        return int(digits)
+    if len(digits) == 11 and digits[0] == '1':
+        return int(digits[1:])
+    if 12 <= len(digits) <= 15:
+        return INTL | int(digits)
+    # Anything else with 10+ digits: last 10, as clean_number always did
+    return int(digits[-10:]) if len(digits) >= 10 else None
+
+def is_nanp(key):
+    return key is not None and not key & INTL
+
+def area_code(key):
+    """Three-digit NANP area code as an int, None for international or missing keys"""
+    return key // AREA_DIVISOR if is_nanp(key) else None
+
+def format_number(key):
+    if key is None: return None
+    return '+%d' % (key ^ INTL) if key & INTL else '%010d' % key
+
+def clean_number(number):
+    """Canonical string form of a raw number (None if it has no key)"""
+    return format_number(number_key(number))
@@ -0,0 +1,224 @@
+import argparse, multiprocessing, os, queue, re, time
+from itertools import chain, groupby, islice
+
+from carrier_store import CarrierStore
+from columnar import FORMATS, RecordWriter, concat_record_files, record_file
+from phone import format_number, number_key
+from records import LEARN_ROWS, BlobWriter, RowParser, assemble_rows, iter_records, learn_columns
+from spam import find_contacts_file, load_contacts, merge_results, new_results, print_report, tally
+from split import RECORD_TYPES, enrich_record, parse_record
+
+"""
+🤔 Sharded split -> enrich -> classify:
+- The parent streams raw rows from one or more dumps and routes each to a shard by
+  its number (a cheap regex, no full parse), so every number lives in exactly one shard
+- Each shard worker parses, enriches and classifies its rows and writes its own part
+  files, so nothing funnels back through the parent except small Counters
+- Workers are forked after contacts are loaded (shared copy-on-write); each opens the
+  carrier store itself, whose mmap'd index is shared through the page cache
+- The parent merges the per-shard stats and concatenates the part files at the end
+- A worker that fails reports its error instead of results; the parent never blocks
+  on a dead shard (queue puts and gets time out and check the workers), stops the
+  others and raises
+"""
+
+BATCH_SIZE = 2000
+OUTPUT_TYPES = list(RECORD_TYPES.values())
+
+_number_field = re.compile(r'(?:^|, |\s)(?:number|address)=([^,]*)')
+
+def shard_of(raw, shards, fallback):
+    # Same number key as parse_record, without a full parse
+    m = _number_field.search(raw)
+    key = number_key(m.group(1)) if m else None
+    return key % shards if key is not None else fallback % shards
+
+def iter_rows(dumps, blobs=None):
+    """Yield (output_type, columns, raw) for every record in the dumps, rows reassembled
+
+    columns are learned from the first rows of each section here, as split.py does,
+    so every shard parses with the same columns whichever rows it gets.
+    """
+    for dump in dumps:
+        for section, pairs in groupby(iter_records(dump, RECORD_TYPES), key=lambda pair: pair[0]):
+            rows = assemble_rows((raw for _, raw in pairs), section == 'voicemail', blobs)
+            head = list(islice(rows, LEARN_ROWS))
+            columns = tuple(learn_columns(head) or ())
+            for raw in chain(head, rows):
+                yield RECORD_TYPES[section], columns, raw
+
+def part_path(outdir, filename, shard):
+    # Keep the extension last so the part's format is recognised
+    name, ext = os.path.splitext(filename)
+    return os.path.join(outdir, f'{name}.part{shard}{ext}')
+
+def run_shard(shard, inbox, results_queue, outdir, carriers_path, contacts, fmt='dat'):
+    carriers = CarrierStore(carriers_path)
+    parsers = {}  # (output_type, columns) -> RowParser
+    results = {output_type: new_results() for output_type in OUTPUT_TYPES}
+    new_numbers = set()
+    outputs = {}
+    for output_type in OUTPUT_TYPES:
+        for name in (output_type, 'spam_' + output_type):
+            outputs[name] = RecordWriter(part_path(outdir, record_file(name, fmt), shard))
+    try:
+        try:
+            for batch in iter(inbox.get, None):
+                for output_type, columns, raw in batch:
+                    parser = parsers.get((output_type, columns))
+                    if parser is None:
+                        parser = parsers[output_type, columns] = RowParser(columns)
+                    record = enrich_record(parse_record(raw, parser), carriers, new_numbers)
+                    outputs[output_type].write(record)
+                    if tally(record, contacts, output_type, results[output_type]):
+                        outputs['spam_' + output_type].write(record)
+        finally:
+            for out in outputs.values():
+                out.close()
+            carriers.close()
+    except Exception as e:
+        results_queue.put((shard, None, f'{type(e).__name__}: {e}'))
+        raise
+    results_queue.put((shard, results, new_numbers))
+
+class ShardResults:
+    """Collects (shard, results, new_numbers) from the workers, failing fast on a dead shard"""
+    def __init__(self, procs, results_queue):
+        self.procs = procs
+        self.queue = results_queue
+        self.results = {}
+
+    def receive(self, timeout):
+        try:
+            shard, results, new_numbers = self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return False
+        if results is None:
+            raise RuntimeError(f"Shard worker {shard} failed: {new_numbers}")
+        self.results[shard] = (shard, results, new_numbers)
+        return True
+
+    def check(self):
+        """Raise if a shard died without sending its results"""
+        while self.receive(0):  # an error report, or results sent just before exiting
+            pass
+        for shard, proc in enumerate(self.procs):
+            if shard not in self.results and not proc.is_alive():
+                raise RuntimeError(f"Shard worker {shard} exited with status {proc.exitcode}")
+
+    def send(self, inbox, item):
+        while True:
+            try:
+                return inbox.put(item, timeout=1)
+            except queue.Full:
+                self.check()
+
+    def collect(self):
+        while len(self.results) < len(self.procs):
+            if not self.receive(1):
+                self.check()
+        return [self.results[shard] for shard in sorted(self.results)]
+
+def concat_parts(outdir, filename, shards):
+    paths = [part_path(outdir, filename, shard) for shard in range(shards)]
+    concat_record_files(paths, os.path.join(outdir, filename))
+    for path in paths:
+        os.remove(path)
+
+def run_pipeline(dumps, contacts, carriers_path='numbers.dat', outdir='.', workers=None, fmt='dat',
+                 blobs_path=None):
+    """Returns ({output_type: results}, new_numbers); results as from spam.process_file
+
+    Voicemail audio is decoded into blobs_path when given (rows are assembled in the
+    parent, so there is one blob file however many shards).
+    """
+    workers = workers or os.cpu_count() or 1
+    CarrierStore(carriers_path).close()  # build/refresh the index once, before forking
+    methods = multiprocessing.get_all_start_methods()
+    ctx = multiprocessing.get_context('fork' if 'fork' in methods else None)
+
+    inboxes = [ctx.Queue(maxsize=8) for _ in range(workers)]
+    results_queue = ctx.Queue()
+    procs = [ctx.Process(target=run_shard, args=(shard, inboxes[shard], results_queue,
+                                                 outdir, carriers_path, contacts, fmt))
+             for shard in range(workers)]
+    for proc in procs:
+        proc.start()
+    received = ShardResults(procs, results_queue)
+
+    batches = [[] for _ in range(workers)]
+    blobs = BlobWriter(blobs_path) if blobs_path else None
+    try:
+        try:
+            for i, (output_type, columns, raw) in enumerate(iter_rows(dumps, blobs)):
+                shard = shard_of(raw, workers, i)
+                batches[shard].append((output_type, columns, raw))
+                if len(batches[shard]) >= BATCH_SIZE:
+                    received.send(inboxes[shard], batches[shard])
+                    batches[shard] = []
+        finally:
+            if blobs is not None:
+                blobs.close()
+        for shard, batch in enumerate(batches):
+            if batch:
+                received.send(inboxes[shard], batch)
+            received.send(inboxes[shard], None)
+
+        # Drain results before joining so workers aren't blocked on a full pipe
+        shard_results = received.collect()
+    except BaseException:
+        for proc, inbox in zip(procs, inboxes):
+            proc.terminate()
+            inbox.cancel_join_thread()  # don't hang at exit flushing batches nobody will read
+        raise
+    for proc in procs:
+        proc.join()
+        if proc.exitcode:
+            raise RuntimeError(f"Shard worker exited with status {proc.exitcode}")
+
+    merged = {output_type: new_results() for output_type in OUTPUT_TYPES}
+    new_numbers = set()
+    for _, results, numbers in shard_results:
+        for output_type in OUTPUT_TYPES:
+            merge_results(merged[output_type], results[output_type])
+        new_numbers |= numbers
+
+    for output_type in OUTPUT_TYPES:
+        concat_parts(outdir, record_file(output_type, fmt), workers)
+        concat_parts(outdir, record_file('spam_' + output_type, fmt), workers)
+    return merged, new_numbers
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Sharded split -> enrich -> spam pipeline")
+    parser.add_argument('dumps', nargs='+', help="phone_records_*.json files")
+    parser.add_argument('--workers', type=int, default=None, help="shards (default: CPU count)")
+    parser.add_argument('--contacts', default=find_contacts_file())
+    parser.add_argument('--numbers', default='numbers.dat', help="carrier store log")
+    parser.add_argument('--outdir', default='.')
+    parser.add_argument('--format', choices=FORMATS, default='dat', help="record file format")
+    parser.add_argument('--blobs', metavar='PATH',
+                        help="write decoded voicemail audio to PATH; records keep _blob_offset/_blob_length")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    start = time.time()
+    contacts = load_contacts(args.contacts)
+    print(f"Loaded {len(contacts)} contacts")
+
+    merged, new_numbers = run_pipeline(args.dumps, contacts, args.numbers, args.outdir, args.workers, args.format,
+                                       args.blobs)
+    total = sum(results[0]['total'] for results in merged.values())
+    elapsed = time.time() - start
+    print(f"Processed {total} records from {len(args.dumps)} dumps in {elapsed:.1f}s "
+          f"({total / elapsed if elapsed else 0:.0f} records/sec)")
+    print(f"Found {len(new_numbers)} new numbers to lookup")
+
+    with CarrierStore(args.numbers) as carriers:
+        for output_type in OUTPUT_TYPES:
+            print_report(output_type, merged[output_type], carriers)
+
+    if new_numbers:
+        with open(os.path.join(args.outdir, 'new_numbers.txt'), 'w') as f:
+            for key in sorted(new_numbers):
+                f.write(f"{format_number(key)}\n")
@@ -0,0 +1,286 @@
+import base64, binascii, json, re
+from itertools import groupby, islice
+
+"""
+🤔 Streaming access to phone_records_*.json:
+- extract.py writes {"calls": [...], "voicemail": [...], "sms_inbox": [...], "sms_sent": [...]}
+  where every record is one raw `content query` line (a JSON string)
+- Instead of json.load'ing the whole dump we walk the top-level object ourselves and
+  decode one array element at a time with raw_decode over a sliding buffer
+- Peak memory is one read chunk plus the largest single record
+- Rows are reassembled by a line-at-a-time state machine (assemble_rows): continuation
+  lines belong to the row above until the next `Row:`, voicemail audio payloads of any
+  length are collected as parts and joined once, and can go to a blob file instead of
+  being inlined
+"""
+
+SECTIONS = ['calls', 'voicemail', 'sms_inbox', 'sms_sent']
+CHUNK_SIZE = 1 << 20
+
+_decoder = json.JSONDecoder()
+_whitespace = re.compile(r'\s*')
+
+class _Reader:
+    def __init__(self, f):
+        self.f = f
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        # Read at least as much as we already hold so huge records don't go quadratic
+        data = self.f.read(max(CHUNK_SIZE, len(self.buf) - self.pos))
+        if not data:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Skip whitespace and return the next character (None at EOF)"""
+        while True:
+            self.pos = _whitespace.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return None
+
+    def expect(self, chars):
+        ch = self.peek()
+        if ch is None or ch not in chars:
+            raise ValueError(f"Expected one of {chars!r} at offset {self.pos}, got {ch!r}")
+        self.pos += 1
+        return ch
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill(): raise
+                continue
+            # A bare number touching the end of the buffer may be truncated
+            if end == len(self.buf) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+def iter_records(f, sections=None):
+    """Yield (section, raw_record) pairs from a phone_records JSON file, in file order.
+
+    f may be a path or an open text file. Only list-valued sections are read;
+    when sections is given, other sections are skipped without being kept.
+    """
+    if isinstance(f, str):
+        with open(f) as fh:
+            yield from iter_records(fh, sections)
+        return
+
+    reader = _Reader(f)
+    reader.expect('{')
+    if reader.peek() == '}': return
+    while True:
+        section = reader.value()
+        reader.expect(':')
+        if reader.peek() == '[':
+            reader.pos += 1
+            wanted = sections is None or section in sections
+            if reader.peek() == ']':
+                reader.pos += 1
+            else:
+                while True:
+                    record = reader.value()
+                    if wanted:
+                        yield section, record
+                    if reader.expect(',]') == ']': break
+        else:
+            reader.value()
+        if reader.expect(',}') == '}': return
+
+def iter_sections(f, sections=None):
+    """Yield (section, records_iterator) once per section, streaming its records"""
+    for section, pairs in groupby(iter_records(f, sections), key=lambda pair: pair[0]):
+        yield section, (record for _, record in pairs)
+
+_row_prefix = re.compile(r'\s*(?:Row:\s*)?\d+\s+')
+_key_boundary = re.compile(r', (?=[A-Za-z_][A-Za-z0-9_]*=)')
+
+def strip_row(line):
+    """Drop the `Row: N ` prefix and trailing newline from a content query line"""
+    m = _row_prefix.match(line)
+    return (line[m.end():] if m else line).rstrip('\r\n')
+
+def split_fields(line):
+    """Generic single-pass split of `k=v, k=v` on `, key=` boundaries"""
+    fields = {}
+    for part in _key_boundary.split(strip_row(line)):
+        key, sep, value = part.partition('=')
+        if sep:
+            fields[key.strip()] = value
+    return fields
+
+LEARN_ROWS = 1000
+# What finish_row appends to voicemail rows with a payload; not one of the provider's columns
+_appended = re.compile(r'(?:, _encoding=[\w./+-]*)?(?:, _encoded_data=\S*|, _blob_offset=\d+, _blob_length=\d+)'
+                       r'[\r\n]*\Z')
+
+def split_appended(line):
+    """(row without the fields finish_row appended, those fields)"""
+    m = _appended.search(line)
+    if m is None:
+        return line, {}
+    return line[:m.start()], dict(part.partition('=')[::2] for part in m.group(0).strip().split(', ') if part)
+
+def discover_columns(line):
+    return list(split_fields(line))
+
+def learn_columns(rows):
+    """Columns every row has, in first-row order; None without rows.
+
+    A `, k=` inside a value (an SMS body like "a=b, c=d") looks like a column in the
+    rows that contain it, but not in all of them.
+    """
+    columns = None
+    for row in rows:
+        keys = split_fields(split_appended(row)[0])
+        columns = list(keys) if columns is None else [column for column in columns if column in keys]
+    return columns or None
+
+class RowParser:
+    """Parser for the rows of one provider.
+
+    The column list comes from the caller (a projection, or learn_columns over the
+    first rows: with_learned_columns) or else from the first row seen, and is
+    compiled into a single regex that anchors each value between `, col=`
+    separators, so commas and `=` inside values (SMS bodies, base64) survive.
+    A row that doesn't fit drops the columns it lacks (they came from a value in
+    an earlier row) and is matched again; only rows shaped differently altogether
+    fall back to split_fields.
+    """
+    def __init__(self, columns=None):
+        self.columns = None
+        self._pattern = None
+        if columns:
+            self.set_columns(columns)
+
+    def set_columns(self, columns):
+        self.columns = list(columns)
+        body = ', '.join(re.escape(column) + '=(.*?)' for column in self.columns)
+        self._pattern = re.compile(r'\s*(?:(?:Row:\s*)?\d+\s+)?' + body + r'[\r\n]*\Z', re.DOTALL)
+
+    def _relearn(self, line):
+        keys = split_fields(line)
+        columns = [column for column in self.columns if column in keys]
+        if not columns or columns == self.columns:
+            return None
+        self.set_columns(columns)
+        return self._pattern.match(line)
+
+    def __call__(self, line):
+        line, appended = split_appended(line)
+        if self._pattern is None:
+            self.set_columns(discover_columns(line))
+        m = self._pattern.match(line) or self._relearn(line)
+        fields = dict(zip(self.columns, m.groups())) if m else split_fields(line)
+        fields.update(appended)
+        return fields
+
+def with_learned_columns(rows, parser, limit=LEARN_ROWS):
+    """Yield rows (strings), first giving parser the columns of the first `limit` of them"""
+    rows = iter(rows)
+    head = list(islice(rows, limit))
+    if parser.columns is None and head:
+        parser.set_columns(learn_columns(head) or discover_columns(head[0]))
+    yield from head
+    yield from rows
+
+def iter_row_lines(lines):
+    """Group raw content query lines into rows: a `Row:` line plus its continuation lines"""
+    row = []
+    for line in lines:
+        if line.startswith('Row:') and row:
+            yield row
+            row = []
+        row.append(line)
+    if row:
+        yield row
+
+_payload_start = re.compile(r':[A-Za-z0-9+/]{4}[A-Za-z0-9+/=]*\s*\Z')
+_encoding_line = re.compile(r'[\w./+-]{1,32}\Z')  # e.g. `AMR` between a voicemail row and its audio
+
+class BlobWriter:
+    """Append-only file of decoded payloads; rows reference them by offset and length"""
+    def __init__(self, path):
+        self.path = path
+        self.f = open(path, 'wb')
+        self.offset = 0
+
+    def add(self, data):
+        offset = self.offset
+        self.f.write(data)
+        self.offset += len(data)
+        return offset
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def read_blob(path, offset, length):
+    with open(path, 'rb') as f:
+        f.seek(int(offset))
+        return f.read(int(length))
+
+def decode_payload(payload):
+    """Audio bytes of a `:`-prefixed base64 payload, None if it isn't valid base64"""
+    data = payload[1:]
+    try:
+        return base64.b64decode(data + '=' * (-len(data) % 4), validate=True)
+    except (binascii.Error, ValueError):
+        return None
+
+def finish_row(head, extra, payload, blobs=None, encoding=None):
+    row = '\n'.join([head] + extra) if extra else head
+    if payload is None:
+        return row
+    if encoding is not None:
+        row = f'{row}, _encoding={encoding}'
+    payload = ''.join(payload)
+    data = decode_payload(payload) if blobs is not None else None
+    if data is None:
+        return f'{row}, _encoded_data={payload}'
+    return f'{row}, _blob_offset={blobs.add(data)}, _blob_length={len(data)}'
+
+def assemble_rows(lines, payloads=False, blobs=None):
+    """Reassemble raw content query lines into one string per row.
+
+    Lines after a `Row:` line are joined to it with '\n' until the next `Row:`
+    (multi-line SMS bodies and the like). With payloads (voicemail), a `:`-prefixed
+    base64 line starts the row's audio payload: it and the lines after it are
+    appended as `_encoded_data`, or, given a BlobWriter, decoded into it and
+    referenced as `_blob_offset`/`_blob_length`. A short line right before the
+    payload (the audio format, e.g. `AMR`) becomes `_encoding`, not part of the row.
+    """
+    head, extra, payload, encoding = None, [], None, None
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if line.startswith('Row:') or head is None:
+            if head is not None:
+                yield finish_row(head, extra, payload, blobs, encoding)
+            head, extra, payload, encoding = line, [], None, None
+        elif payload is not None:
+            payload.append(line.strip())
+        elif payloads and _payload_start.match(line.strip()):
+            payload = [line.strip()]
+            if extra and _encoding_line.match(extra[-1].strip()):
+                encoding = extra.pop().strip()
+        else:
+            extra.append(line)
+    if head is not None:
+        yield finish_row(head, extra, payload, blobs, encoding)
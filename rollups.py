@@ -0,0 +1,209 @@
+import argparse, hashlib, json, os, sqlite3, time
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from columnar import file_format, find_record_file, read_records
+from phone import area_code, format_number, number_key
+from spam import RULES, find_contacts_file, load_contacts
+
+"""
+🤔 Time-windowed spam analytics without rescanning record files:
+- `update` classifies records with spam.py's rules and adds them to day and week
+  buckets (from the record's `date`, UTC) in rollups.db: record and spam totals, and
+  spam counts by reason, carrier, area code and number
+- Each record rolled up is remembered by identity (a 64-bit hash of record type, _id,
+  date and number key, like merge.py's rows), so a record is counted once however
+  often it is read: late records (a second handset, a merged older dump) are added to
+  their old buckets, records sharing a millisecond are all kept, re-reads are no-ops
+- Each record file's size/mtime and read offset are kept: unchanged files are skipped,
+  a .dat file that grew is read from where the last update stopped (checked against a
+  digest of the bytes before that offset), anything else is read again in full and
+  deduplicated; only the buckets new records fall in are touched (counts are
+  upserted, one transaction per run)
+- Queries (`top`, `series`) are indexed range scans over a window's buckets: reading
+  30 daily buckets instead of every record, milliseconds for the usual questions
+<rollups_db>
+  rollups(record_type, period, bucket, dimension, value, count)
+    period: day | week, bucket: first day of the period (days since 1970-01-01)
+    dimension: records | spam | reason | carrier | area | number
+  seen(hash)                                 records already rolled up
+  inputs(path, size, mtime, offset, tail, updated)
+</rollups_db>
+"""
+
+RECORD_TYPES = ['calls', 'voicemails', 'sms']
+DIMENSIONS = ('reason', 'carrier', 'area', 'number')
+DAY_MS = 86400 * 1000
+TAIL_BYTES = 4096
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS rollups (record_type TEXT, period TEXT, bucket INTEGER, dimension TEXT,
+                                    value TEXT, count INTEGER,
+                                    PRIMARY KEY (dimension, period, bucket, record_type, value)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS seen (hash INTEGER PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS inputs (path TEXT PRIMARY KEY, size INTEGER, mtime REAL, offset INTEGER, tail TEXT,
+                                   updated REAL);
+'''
+
+def open_db(path):
+    db = sqlite3.connect(path)
+    db.executescript(SCHEMA)
+    return db
+
+def buckets(date_ms):
+    """(day, week) bucket numbers for a ms timestamp; weeks start on Monday"""
+    day = date_ms // DAY_MS
+    return day, day - (day + 3) % 7  # 1970-01-01 was a Thursday
+
+def bucket_date(bucket):
+    return date(1970, 1, 1) + timedelta(days=bucket)
+
+def record_hash(record_type, record, key):
+    """Signed 64-bit digest of a record's identity (the whole record if it has no _id/date)"""
+    row_id, date_ms = record.get('_id'), record.get('date')
+    text = (f'{record_type}\0{row_id}\0{date_ms}\0{key}' if row_id or date_ms
+            else f'{record_type}\0{json.dumps(record, sort_keys=True)}')
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), 'big', signed=True)
+
+def rollup_records(records, contacts, record_type, is_new=None, rules=RULES):
+    """Count the records is_new(record_type, record, key) accepts (default all); returns a Counter of rollup keys"""
+    counts = Counter()
+    for record in records:
+        try:
+            date_ms = int(record.get('date'))
+        except (TypeError, ValueError):
+            continue
+        key = number_key(record.get('number'))
+        if is_new is not None and not is_new(record_type, record, key): continue
+        spam, reason = rules.evaluate(record, contacts, record_type, key)
+        for period, bucket in zip(('day', 'week'), buckets(date_ms)):
+            counts[period, bucket, 'records', ''] += 1
+            if not spam: continue
+            counts[period, bucket, 'spam', ''] += 1
+            counts[period, bucket, 'reason', reason] += 1
+            counts[period, bucket, 'carrier', record.get('carrier') or 'Unknown'] += 1
+            area = area_code(key)
+            if area is not None:
+                counts[period, bucket, 'area', str(area)] += 1
+            if key is not None:
+                counts[period, bucket, 'number', str(key)] += 1
+    return counts
+
+def tail_digest(f, offset):
+    """Digest of the bytes just before offset, to tell an appended file from a rewritten one"""
+    start = max(0, offset - TAIL_BYTES)
+    f.seek(start)
+    return hashlib.blake2b(f.read(offset - start), digest_size=16).hexdigest()
+
+def read_new_records(db, path):
+    """Yield the records of path an earlier update may not have read, then note how far it got"""
+    if not os.path.exists(path): return
+    stat = os.stat(path)
+    path = os.path.abspath(path)
+    seen = db.execute('SELECT size, mtime, offset, tail FROM inputs WHERE path = ?', (path,)).fetchone()
+    if seen and seen[:2] == (stat.st_size, stat.st_mtime):
+        return
+    offset, tail = stat.st_size, None
+    if file_format(path) == 'dat':
+        with open(path, 'rb') as f:
+            appended = seen and seen[2] <= stat.st_size and tail_digest(f, seen[2]) == seen[3]
+            offset = seen[2] if appended else 0
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b'\n'): break  # still being written: next run picks it up
+                offset += len(line)
+                yield json.loads(line)
+            tail = tail_digest(f, offset)
+    else:
+        yield from read_records(path)
+    db.execute('INSERT OR REPLACE INTO inputs VALUES (?, ?, ?, ?, ?, ?)',
+               (path, stat.st_size, stat.st_mtime, offset, tail, time.time()))
+
+def update(db, contacts, record_types=RECORD_TYPES, rules=RULES):
+    """Roll up records not rolled up before from every type's record file; returns {record_type: records added}"""
+    def is_new(record_type, record, key):
+        return db.execute('INSERT OR IGNORE INTO seen VALUES (?)', (record_hash(record_type, record, key),)).rowcount
+    added = {}
+    with db:
+        for record_type in record_types:
+            counts = rollup_records(read_new_records(db, find_record_file(record_type)), contacts,
+                                    record_type, is_new, rules)
+            db.executemany('''INSERT INTO rollups VALUES (?, ?, ?, ?, ?, ?)
+                              ON CONFLICT (dimension, period, bucket, record_type, value)
+                              DO UPDATE SET count = count + excluded.count''',
+                           ((record_type, period, bucket, dimension, value, count)
+                            for (period, bucket, dimension, value), count in counts.items()))
+            added[record_type] = sum(count for (period, _, dimension, _), count in counts.items()
+                                     if period == 'day' and dimension == 'records')
+    return added
+
+def window(days, end=None):
+    """First and last day bucket of the `days` days ending on end (default today, UTC)"""
+    end = end or datetime.now(timezone.utc).date()
+    last = (end - date(1970, 1, 1)).days
+    return last - days + 1, last
+
+def type_filter(record_type):
+    return (' AND record_type = ?', (record_type,)) if record_type else ('', ())
+
+def top(db, dimension, days, n=10, record_type=None, end=None):
+    """[(value, count)] with the most spam in the window"""
+    first, last = window(days, end)
+    where, params = type_filter(record_type)
+    return db.execute(f'''SELECT value, SUM(count) AS total FROM rollups
+                          WHERE dimension = ? AND period = 'day' AND bucket BETWEEN ? AND ?{where}
+                          GROUP BY value ORDER BY total DESC, value LIMIT ?''',
+                      (dimension, first, last, *params, n)).fetchall()
+
+def series(db, period, days, record_type=None, end=None):
+    """[(bucket, records, spam)] per day or week overlapping the window"""
+    first, last = window(days, end)
+    if period == 'week':
+        first = buckets(first * DAY_MS)[1]
+    where, params = type_filter(record_type)
+    return db.execute(f'''SELECT bucket, SUM(CASE WHEN dimension = 'records' THEN count ELSE 0 END),
+                                 SUM(CASE WHEN dimension = 'spam' THEN count ELSE 0 END)
+                          FROM rollups WHERE dimension IN ('records', 'spam') AND period = ?
+                          AND bucket BETWEEN ? AND ?{where} GROUP BY bucket ORDER BY bucket''',
+                      (period, first, last, *params)).fetchall()
+
+def format_value(dimension, value):
+    return format_number(int(value)) if dimension == 'number' else value
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Day/week spam rollups and queries over them")
+    parser.add_argument('--db', default='rollups.db')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('update', help="roll up records not rolled up before")
+    query = argparse.ArgumentParser(add_help=False)
+    query.add_argument('--days', type=int, default=30, help="window length, ending on --end")
+    query.add_argument('--end', type=date.fromisoformat, help="last day of the window (default today, UTC)")
+    query.add_argument('--type', choices=RECORD_TYPES, help="one record type (default all)")
+    top_parser = commands.add_parser('top', parents=[query], help="top spam numbers/carriers/areas/reasons")
+    top_parser.add_argument('--by', choices=DIMENSIONS, default='number')
+    top_parser.add_argument('-n', type=int, default=10)
+    series_parser = commands.add_parser('series', parents=[query], help="records and spam per day or week")
+    series_parser.add_argument('--period', choices=('day', 'week'), default='day')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    start = time.time()
+    db = open_db(args.db)
+    try:
+        if args.command == 'update':
+            contacts = load_contacts(find_contacts_file())
+            for record_type, count in update(db, contacts).items():
+                print(f"{record_type}: {count} new records rolled up")
+        elif args.command == 'top':
+            rows = top(db, args.by, args.days, args.n, args.type, args.end)
+            print(f"Top spam {args.by}s, last {args.days} days{f' ({args.type})' if args.type else ''}:")
+            for value, count in rows:
+                print(f"  {format_value(args.by, value)}: {count}")
+        else:
+            rows = series(db, args.period, args.days, args.type, args.end)
+            print(f"Spam per {args.period}, last {args.days} days{f' ({args.type})' if args.type else ''}:")
+            for bucket, records, spam in rows:
+                print(f"  {bucket_date(bucket)}: {spam}/{records} spam ({spam / records if records else 0:.1%})")
+    finally:
+        db.close()
+    print(f"({(time.time() - start) * 1000:.0f} ms)")
@@ -0,0 +1,119 @@
+import json, os, re
+from phone import is_nanp, number_key
+
+"""
+🤔 Spam rules, compiled once at startup from spam_rules.json:
+- allow_numbers -> dict of integer number keys (see phone.py) -> reason
+- allow_prefixes -> per prefix length, a dict of NANP key prefixes; a number matches
+  when key // 10**(10 - length) is in it (area codes are length 3)
+- spam carrier / carrier_type substrings -> one combined case-insensitive regex each,
+  with the result memoized per distinct carrier string
+- record_type_rules -> (record types, field, reason): a truthy field keeps the record
+<evaluation_order>
+no number -> allow number -> allow prefix -> record type rule -> spam carrier
+-> spam carrier type -> in contacts (not spam) -> not in contacts (spam)
+</evaluation_order>
+Every evaluation returns (is_spam, reason) so callers never re-run the checks.
+Numbers are compared as integer keys; callers that already have the key pass it in.
+"""
+
+RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'spam_rules.json')
+
+def build_prefixes(prefixes):
+    """{divisor: {key prefix: reason}} for NANP digit prefixes; the first listed wins"""
+    tables = {}
+    for prefix, reason in prefixes:
+        prefix = str(prefix)
+        tables.setdefault(10 ** (10 - len(prefix)), {}).setdefault(int(prefix), reason)
+    # Shorter prefixes first, like walking the digits left to right
+    return dict(sorted(tables.items(), reverse=True))
+
+def combined_pattern(patterns):
+    if not patterns: return None
+    # Longest first so overlapping patterns can't shadow each other
+    alternatives = sorted(set(patterns), key=len, reverse=True)
+    return re.compile('|'.join(re.escape(p) for p in alternatives), re.IGNORECASE)
+
+class RuleSet:
+    def __init__(self, config):
+        allow = config.get('allow_numbers', {})
+        self.allow_numbers = {number_key(str(n)): allow.get('reason', 'allowed_number')
+                              for n in allow.get('numbers', [])}
+        self.allow_prefixes = build_prefixes((p['prefix'], p['reason']) for p in config.get('allow_prefixes', []))
+        self.record_rules = [(set(r['record_types']), r['field'], r['reason'])
+                             for r in config.get('record_type_rules', [])]
+
+        carriers = config.get('spam_carriers', {})
+        self.carrier_pattern = combined_pattern(carriers.get('patterns', []))
+        self.carrier_reason = carriers.get('reason', 'spam_known_carrier')
+        types = config.get('spam_carrier_types', {})
+        self.type_pattern = combined_pattern(types.get('patterns', []))
+        self.type_reason = types.get('reason', 'spam_voip_type')
+
+        contacts = config.get('contacts', {})
+        self.in_contacts_reason = contacts.get('in_contacts', 'in_contacts')
+        self.not_in_contacts_reason = contacts.get('not_in_contacts', 'spam_not_in_contacts')
+
+        self.scoring = config.get('number_scoring', {})  # scoring.py's per-number weights
+
+        self._carrier_cache = {}
+        self._type_cache = {}
+
+    def allow_reason(self, key):
+        """Reason if the number key is allowlisted exactly or by prefix, else None"""
+        reason = self.allow_numbers.get(key)
+        if reason or not is_nanp(key): return reason
+        for divisor, prefixes in self.allow_prefixes.items():
+            reason = prefixes.get(key // divisor)
+            if reason: return reason
+        return None
+
+    def record_reason(self, record, record_type):
+        for record_types, field, reason in self.record_rules:
+            if record_type in record_types and record.get(field):
+                return reason
+        return None
+
+    def carrier_is_spam(self, carrier):
+        if carrier not in self._carrier_cache:
+            text = str(carrier or '')
+            self._carrier_cache[carrier] = bool(text and self.carrier_pattern and self.carrier_pattern.search(text))
+        return self._carrier_cache[carrier]
+
+    def type_is_spam(self, carrier_type):
+        if carrier_type not in self._type_cache:
+            text = str(carrier_type or '')
+            self._type_cache[carrier_type] = bool(text and self.type_pattern and self.type_pattern.search(text))
+        return self._type_cache[carrier_type]
+
+    def evaluate(self, record, contacts, record_type, key=None):
+        """Return (is_spam, reason) for one enriched record; contacts holds number keys"""
+        if key is None:
+            key = number_key(record.get('number'))
+        if key is None:
+            return False, self.record_reason(record, record_type)
+
+        reason = self.allow_reason(key) or self.record_reason(record, record_type)
+        if reason:
+            return False, reason
+        if self.carrier_is_spam(record.get('carrier')):
+            return True, self.carrier_reason
+        if self.type_is_spam(record.get('carrier_type')):
+            return True, self.type_reason
+        if key in contacts:
+            return False, self.in_contacts_reason
+        return True, self.not_in_contacts_reason
+
+    @property
+    def reasons(self):
+        """Every reason this rule set can return, in a stable order"""
+        reasons = list(dict.fromkeys(
+            list(self.allow_numbers.values()) +
+            [r for prefixes in self.allow_prefixes.values() for r in prefixes.values()] +
+            [r for _, _, r in self.record_rules] +
+            [self.carrier_reason, self.type_reason, self.in_contacts_reason, self.not_in_contacts_reason]))
+        return reasons
+
+def load_rules(path=RULES_FILE):
+    with open(path) as f:
+        return RuleSet(json.load(f))
@@ -1,10 +1,159 @@
-import random
+import argparse, json, os, random
+from collections import defaultdict
+from math import exp, floor, log
 
-if __name__ == "__main__":
-    with open('sampled.txt', 'w') as fout:
-        with open('raw_logs.txt', 'r') as f:
+from carrier_store import CarrierStore
+from columnar import FORMATS, RecordWriter, read_records
+from phone import area_code, number_key
+from records import SECTIONS, RowParser, iter_row_lines, iter_sections, split_fields, with_learned_columns
+
+"""
+🤔 Sampling test fixtures out of big inputs:
+- Inputs are streamed (1MB buffered reads, or the streaming dump reader); nothing is
+  echoed to stdout, which was the dominant cost of the old script
+- Input kind follows the extension: phone_records_*.json dumps, record files
+  (.dat/.parquet/.arrow) or anything else as raw text lines; output is the same kind,
+  so a sampled dump can be fed straight back into split.py/parse.py
+- Dump rows are sampled whole (a `Row:` line plus continuation lines), so voicemail
+  payloads and multi-line SMS bodies stay intact
+- -n gives an exact-size reservoir (Algorithm L: random draws only when an item is
+  taken), one per stratum with --by; without -n it's the old 1% Bernoulli sample
+- Sampled items are written back in input order; --seed makes runs reproducible
+"""
+
+BUFFER_SIZE = 1 << 20
+STRATA = ('type', 'carrier', 'area')
+
+class Reservoir:
+    """Uniform fixed-size sample of a stream (Li's Algorithm L)"""
+    def __init__(self, size, rng):
+        self.size = size
+        self.rng = rng
+        self.items = []
+        self.seen = 0
+        self.w = 1.0
+        self.next = size
+
+    def offer(self, item):
+        i = self.seen
+        self.seen += 1
+        if i < self.size:
+            self.items.append(item)
+            if self.seen == self.size:
+                self._skip(i)
+        elif self.size and i == self.next:
+            self.items[self.rng.randrange(self.size)] = item
+            self._skip(i)
+
+    def _skip(self, i):
+        self.w *= exp(log(self.rng.random() or 1e-300) / self.size)
+        self.next = i + floor(log(self.rng.random() or 1e-300) / log(1 - self.w)) + 1
+
+def input_kind(path):
+    if path.endswith('.json'):
+        return 'dump'
+    if any(path.endswith(suffix) for suffix in FORMATS.values()):
+        return 'records'
+    return 'text'
+
+def iter_items(path, kind, need_fields):
+    """Yield (record_type, fields, payload) for every sampling unit of path"""
+    if kind == 'text':
+        with open(path, buffering=BUFFER_SIZE) as f:
             for line in f:
-                print(line)
-                if random.random() < 0.01:
-                    fout.write(line)
-                line = line.split(',')
+                yield None, split_fields(line) if need_fields else None, line
+    elif kind == 'dump':
+        for section, lines in iter_sections(path, SECTIONS):
+            parser = RowParser()
+            rows = with_learned_columns(('\n'.join(row) for row in iter_row_lines(lines)), parser)
+            for row in rows:
+                yield section, parser(row) if need_fields else None, row.split('\n')
+    else:
+        record_type = os.path.basename(path).split('.')[0]
+        for record in read_records(path):
+            yield record_type, record, record
+
+def stratum(by, record_type, fields, carriers=None):
+    if by == 'type':
+        return record_type
+    key = number_key(fields.get('number') or fields.get('address'))
+    if by == 'area':
+        return area_code(key)
+    carrier = fields.get('carrier')
+    if carrier is None and carriers is not None and key is not None:
+        carrier = carriers.get(key, {}).get('carrier')
+    return carrier
+
+def sample(paths, size=None, fraction=0.01, by=None, seed=None, carriers=None):
+    """Return sampled (record_type, payload) pairs in input order"""
+    rng = random.Random(seed)
+    reservoirs = defaultdict(lambda: Reservoir(size, rng))
+    taken = []
+    need_fields = by in ('carrier', 'area')
+    seq = 0
+    for path in paths:
+        for record_type, fields, payload in iter_items(path, input_kind(path), need_fields):
+            item = (seq, record_type, payload)
+            seq += 1
+            if size is None:
+                if rng.random() < fraction:
+                    taken.append(item)
+            else:
+                key = stratum(by, record_type, fields, carriers) if by else None
+                reservoirs[key].offer(item)
+    if size is not None:
+        taken = sorted(item for reservoir in reservoirs.values() for item in reservoir.items)
+    return [(record_type, payload) for _, record_type, payload in taken]
+
+def write_sample(items, kind, outfile):
+    if kind == 'text':
+        with open(outfile, 'w') as f:
+            f.writelines(payload for _, payload in items)
+    elif kind == 'dump':
+        dump = {section: [] for section in SECTIONS}
+        for section, row in items:
+            dump[section].extend(row)
+        with open(outfile, 'w') as f:
+            json.dump(dump, f, indent=2)
+    else:
+        with RecordWriter(outfile) as out:
+            for _, record in items:
+                out.write(record)
+
+DEFAULT_OUTPUT = {'text': 'sampled.txt', 'dump': 'sampled.json', 'records': 'sampled.dat'}
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Sample raw logs, dumps or record files")
+    parser.add_argument('inputs', nargs='*', default=['raw_logs.txt'],
+                        help="raw text, phone_records_*.json or .dat/.parquet/.arrow files")
+    parser.add_argument('-o', '--output', help="default sampled.txt/.json/.dat by input kind")
+    parser.add_argument('-n', '--size', type=int, help="exact sample size (per stratum with --by)")
+    parser.add_argument('--fraction', type=float, default=0.01, help="Bernoulli rate when -n isn't given")
+    parser.add_argument('--by', choices=STRATA, help="stratify by record type, carrier or area code")
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--numbers', default='numbers.dat',
+                        help="carrier store used for --by carrier on inputs without carrier data")
+    args = parser.parse_args(argv)
+    if args.size is not None and args.size < 1:
+        parser.error("-n/--size must be at least 1")
+    return args
+
+def main(argv=None, open_carriers=CarrierStore):
+    """Write a sample; returns its filename"""
+    args = parse_args(argv)
+    kinds = {input_kind(path) for path in args.inputs}
+    if len(kinds) != 1:
+        raise SystemExit("All inputs must be the same kind (raw text, dumps or record files)")
+    kind = kinds.pop()
+    outfile = args.output or DEFAULT_OUTPUT[kind]
+
+    carriers = None
+    if args.by == 'carrier' and kind != 'records' and os.path.exists(args.numbers):
+        carriers = open_carriers(args.numbers)
+    items = sample(args.inputs, args.size, args.fraction, args.by, args.seed, carriers)
+    write_sample(items, kind, outfile)
+    print(f"Wrote {len(items)} sampled {'rows' if kind == 'dump' else 'records'} to {outfile}")
+    return outfile
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+import argparse, math, time
+from collections import Counter
+from columnar import RecordWriter, file_format, find_record_file, read_records, record_file
+from phone import format_number, number_key
+from spam import RULES, find_contacts_file, load_contacts
+
+"""
+🤔 Scoring numbers instead of records:
+- One streaming pass over calls/voicemails/sms record files aggregates per-number
+  features in a dict keyed by number key (hash aggregation; memory follows distinct
+  numbers, not records): counts per type, duration sum/sum of squares, zero-length
+  and short calls, hours of day seen, records outside calling hours
+- Each distinct number is then scored once: spam_rules.json's rules still decide
+  allowlists and contacts (never spam), otherwise the rule verdict is one weighted
+  feature next to frequency, zero-duration and short-call share, after-hours share,
+  hour-of-day spread and SMS share (weights in number_scoring)
+- A second pass joins number_score/number_spam/number_reason back onto every record
+  (scored_<type> files, same format as the input); number_scores has one row per number.
+  Record type rules (e.g. a named SMS) keep just the records they match: a number's
+  other records still get its verdict
+- Hours are local time at a fixed UTC offset (this machine's, DST ignored)
+"""
+
+RECORD_TYPES = ['calls', 'voicemails', 'sms']
+
+class NumberStats:
+    __slots__ = ('counts', 'durations', 'duration_sum', 'duration_sq', 'zero', 'short',
+                 'after_hours', 'hours', 'kept', 'carrier', 'carrier_type')
+
+    def __init__(self, record):
+        self.counts = Counter()
+        self.durations = self.zero = self.short = self.after_hours = self.hours = 0
+        self.duration_sum = self.duration_sq = 0.0
+        self.kept = 0  # records a record_type_rules rule keeps
+        self.carrier = record.get('carrier')
+        self.carrier_type = record.get('carrier_type')
+
+    def add(self, record, record_type, hour, rules):
+        config = rules.scoring
+        self.counts[record_type] += 1
+        if rules.record_reason(record, record_type):
+            self.kept += 1
+        if hour is not None:
+            self.hours |= 1 << hour
+            start, end = config.get('calling_hours', (8, 21))
+            if not start <= hour < end:
+                self.after_hours += 1
+        if record_type != 'sms':
+            try:
+                duration = float(record.get('duration'))
+            except (TypeError, ValueError):
+                return
+            self.durations += 1
+            self.duration_sum += duration
+            self.duration_sq += duration * duration
+            if duration == 0:
+                self.zero += 1
+            elif duration < config.get('short_call_seconds', 10):
+                self.short += 1
+
+    @property
+    def records(self):
+        return sum(self.counts.values())
+
+    def mean_duration(self):
+        return self.duration_sum / self.durations if self.durations else None
+
+    def duration_stdev(self):
+        if not self.durations: return None
+        mean = self.duration_sum / self.durations
+        return math.sqrt(max(0.0, self.duration_sq / self.durations - mean * mean))
+
+    def features(self, config):
+        durations = self.durations or 1
+        return {
+            'frequency': min(1.0, math.log1p(self.records) / math.log1p(config.get('frequent_count', 20))),
+            'zero_duration': self.zero / durations,
+            'short_calls': self.short / durations,
+            'after_hours': self.after_hours / self.records,
+            'hour_spread': bin(self.hours).count('1') / 24,
+            'sms_ratio': self.counts['sms'] / self.records,
+        }
+
+def hour_of_day(record, offset_ms):
+    try:
+        return (int(record.get('date')) + offset_ms) // 3600000 % 24
+    except (TypeError, ValueError):
+        return None
+
+def aggregate(record_types=RECORD_TYPES, rules=RULES, offset_ms=None):
+    """{number key: NumberStats} over every record file"""
+    if offset_ms is None:
+        offset_ms = time.localtime().tm_gmtoff * 1000
+    stats = {}
+    for record_type in record_types:
+        for record in read_records(find_record_file(record_type), ['number', 'date', 'duration', 'name',
+                                                                   'carrier', 'carrier_type']):
+            key = number_key(record.get('number'))
+            if key is None: continue
+            number_stats = stats.get(key)
+            if number_stats is None:
+                number_stats = stats[key] = NumberStats(record)
+            number_stats.add(record, record_type, hour_of_day(record, offset_ms), rules)
+    return stats
+
+def score_number(key, number_stats, contacts, rules=RULES):
+    """(score, is_spam, reason) for one number"""
+    config = rules.scoring
+    allowed = rules.allow_reason(key)
+    if allowed:
+        return 0.0, False, allowed
+    record = {'carrier': number_stats.carrier, 'carrier_type': number_stats.carrier_type}
+    rule_spam, rule_reason = rules.evaluate(record, contacts, None, key)
+    if not rule_spam:
+        return 0.0, False, rule_reason  # in contacts
+    weights = config.get('weights', {})
+    contributions = {name: weights.get(name, 0) * value
+                     for name, value in number_stats.features(config).items()}
+    contributions['rules'] = weights.get('rules', 0) * rule_spam
+    score = sum(contributions.values())
+    top = max(contributions, key=contributions.get)
+    reason = rule_reason if top == 'rules' else f'number_{top}'
+    return score, score >= config.get('threshold', 0.5), reason
+
+def score_numbers(stats, contacts, rules=RULES):
+    return {key: score_number(key, number_stats, contacts, rules) for key, number_stats in stats.items()}
+
+def fmt_float(value):
+    return None if value is None else f'{value:.3f}'
+
+def write_scores(path, stats, scores, contacts):
+    with RecordWriter(path) as out:
+        for key in sorted(stats, key=lambda k: -scores[k][0]):
+            number_stats, (score, spam, reason) = stats[key], scores[key]
+            out.write({'number': format_number(key), 'number_score': fmt_float(score),
+                       'number_spam': str(int(spam)), 'number_reason': reason,
+                       'records': str(number_stats.records), 'calls': str(number_stats.counts['calls']),
+                       'voicemails': str(number_stats.counts['voicemails']), 'sms': str(number_stats.counts['sms']),
+                       'mean_duration': fmt_float(number_stats.mean_duration()),
+                       'duration_stdev': fmt_float(number_stats.duration_stdev()),
+                       'zero_duration': str(number_stats.zero), 'after_hours': str(number_stats.after_hours),
+                       'kept': str(number_stats.kept),
+                       'hours': str(bin(number_stats.hours).count('1')),
+                       'in_contacts': str(int(key in contacts)),
+                       'carrier': number_stats.carrier, 'carrier_type': number_stats.carrier_type})
+
+def join_scores(infile, outfile, scores, record_type, rules=RULES):
+    """Copy infile to outfile with each record's number verdict added; returns (records, spam)"""
+    total = spam = 0
+    with RecordWriter(outfile) as out:
+        for record in read_records(infile):
+            verdict = scores.get(number_key(record.get('number')))
+            kept = rules.record_reason(record, record_type)
+            if verdict is not None and kept:
+                verdict = (verdict[0], False, kept)
+            if verdict is not None:
+                record['number_score'] = fmt_float(verdict[0])
+                record['number_spam'] = str(int(verdict[1]))
+                record['number_reason'] = verdict[2]
+                spam += verdict[1]
+            out.write(record)
+            total += 1
+    return total, spam
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Score each distinct number from its calls/voicemails/sms")
+    parser.add_argument('--threshold', type=float, help="spam score threshold (default from spam_rules.json)")
+    parser.add_argument('--no-join', action='store_true', help="only write number_scores, not scored_<type> files")
+    parser.add_argument('-n', type=int, default=10, help="top numbers to print")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.threshold is not None:
+        RULES.scoring['threshold'] = args.threshold
+    start = time.time()
+    contacts = load_contacts(find_contacts_file())
+    stats = aggregate()
+    scores = score_numbers(stats, contacts)
+    fmt = file_format(find_record_file(RECORD_TYPES[0]))
+    write_scores(record_file('number_scores', fmt), stats, scores, contacts)
+
+    spam_numbers = sum(spam for _, spam, _ in scores.values())
+    reasons = Counter(reason for _, spam, reason in scores.values() if spam)
+    print(f"Scored {len(scores)} numbers in {time.time() - start:.1f}s: {spam_numbers} spam")
+    for reason, count in reasons.most_common():
+        print(f"  - {reason}: {count}")
+
+    if not args.no_join:
+        for record_type in RECORD_TYPES:
+            infile = find_record_file(record_type)
+            total, spam = join_scores(infile, record_file(f'scored_{record_type}', file_format(infile)), scores,
+                                      record_type)
+            print(f"{record_type}: {spam} of {total} records from spam numbers")
+
+    print(f"\nTop {args.n} numbers by score:")
+    for key in sorted(scores, key=lambda k: -scores[k][0])[:args.n]:
+        score, spam, reason = scores[key]
+        number_stats = stats[key]
+        print(f"  {format_number(key)}: {score:.2f} ({reason}) - {number_stats.records} records, "
+              f"{number_stats.zero} zero-length, mean {number_stats.mean_duration() or 0:.0f}s")
@@ -0,0 +1,114 @@
+import heapq, math
+
+"""
+🤔 Bounded-memory field statistics:
+- SpaceSaving keeps at most `capacity` counters; until it first has to evict, its counts
+  (and therefore top-k and distinct count) are exact, so low-cardinality fields like
+  type or carrier report exactly what a Counter would
+- Once it evicts, counts are upper bounds (count - error is a lower bound) and the
+  distinct count falls back to a HyperLogLog; that is only started at the first
+  eviction, seeded from the counters (which then still hold every value seen)
+- Eviction finds the minimum through a lazily refreshed heap instead of scanning
+- HyperLogLog hashes with Python's hash() plus a 64-bit mixer: stable within one run,
+  which is all a single stats pass needs
+"""
+
+MASK64 = (1 << 64) - 1
+
+def mix64(x):
+    """splitmix64 finalizer; spreads hash() (identity for small ints) over 64 bits"""
+    x = (x + 0x9E3779B97F4A7C15) & MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK64
+    return x ^ (x >> 31)
+
+class HyperLogLog:
+    def __init__(self, p=12):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(self.m)
+
+    def add(self, value):
+        x = mix64(hash(value) & MASK64)
+        w = x >> self.p
+        rank = 64 - self.p - w.bit_length() + 1
+        i = x & (self.m - 1)
+        if rank > self.registers[i]:
+            self.registers[i] = rank
+
+    def __len__(self):
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)  # linear counting for small cardinalities
+        return int(round(estimate))
+
+class SpaceSaving:
+    def __init__(self, capacity=1024):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.heap = []
+        self.evicted = False
+
+    def add(self, item):
+        counts = self.counts
+        if item in counts:
+            counts[item] += 1
+        elif len(counts) < self.capacity:
+            counts[item] = 1
+            heapq.heappush(self.heap, (1, item))
+        else:
+            count, victim = self._pop_min()
+            del counts[victim]
+            self.errors.pop(victim, None)
+            counts[item] = count + 1
+            self.errors[item] = count
+            heapq.heappush(self.heap, (count + 1, item))
+            self.evicted = True
+
+    def _pop_min(self):
+        # Heap entries go stale as counts grow; refresh them until the top is current
+        while True:
+            count, item = heapq.heappop(self.heap)
+            current = self.counts[item]
+            if current == count:
+                return count, item
+            heapq.heappush(self.heap, (current, item))
+
+    def most_common(self, n=None):
+        """(item, count) pairs, highest first; ties keep first-seen order like Counter"""
+        ranked = sorted(self.counts.items(), key=lambda pair: -pair[1])
+        return ranked if n is None else ranked[:n]
+
+    def error(self, item):
+        return self.errors.get(item, 0)
+
+class FieldStats:
+    """Top-k and distinct count for one field, exact until the sketch fills"""
+    def __init__(self, capacity=4096):
+        self.top = SpaceSaving(capacity)
+        self.distinct = None
+
+    def add(self, value):
+        if self.distinct is not None:
+            self.distinct.add(value)
+        elif value not in self.top.counts and len(self.top.counts) >= self.top.capacity:
+            self.distinct = HyperLogLog()
+            for seen in self.top.counts:
+                self.distinct.add(seen)
+            self.distinct.add(value)
+        self.top.add(value)
+
+    @property
+    def exact(self):
+        return not self.top.evicted
+
+    def distinct_count(self):
+        return len(self.top.counts) if self.exact else len(self.distinct)
+
+    def most_common(self, n=None):
+        """(value, count, error) triples; the true count is in [count - error, count]"""
+        return [(value, count, self.top.error(value)) for value, count in self.top.most_common(n)]
@@ -1,127 +1,115 @@
-import json, sys
+import argparse, json, metrics, os
 from collections import Counter
+from carrier_store import CarrierStore
+from columnar import RecordWriter, file_format, find_record_file, read_records, record_file
+from keyset import MappedKeySet, is_fresh, keyset_path, write_keyset
+from phone import area_code, format_number, number_key
+from rules import load_rules
 
 """
 🤔 Key design decisions:
-- Loading contacts as a set of numbers for fast lookup
+- Loading contacts as a set of integer number keys (phone.py) for fast lookup,
+  memory-mapped from contacts.bin (built from contacts.jsonl/.json when missing or stale)
 - Processing each record type separately due to different rules
 - Keeping all enriched data in the output
 - Using Counter for stats
 """
 
-SPAM_CARRIERS = {
-    "SINCH (FKA INTELIQUENT/NEUTRAL TANDEM)",
-    "BANDWIDTH",
-    "O1 COMMUNICATIONS",
-    "TELNYX LLC",
-    "VOIPSTREET, INC.",
-    "FRACTEL, LLC",
-    "LUMEN (FKA CENTURYLINK)"
-}
-
-def clean_number(number):
-    if not number: return None
-    digits = ''.join(c for c in str(number) if c.isdigit())
-    return digits[-10:] if len(digits) >= 10 else None
+# Allowlists, spam carriers and carrier types live in spam_rules.json
+RULES = load_rules()
 
-def load_contacts(filename):
-    """Load contacts and clean numbers"""
+CONTACTS_FILES = ('contacts.jsonl', 'contacts.json')
+
+def read_contact_keys(filename):
+    """Number keys of a contacts file as written by contacts.py (.jsonl, or the older .json)"""
     contacts = set()
     with open(filename) as f:
-        data = json.load(f)
+        if filename.endswith('.jsonl'):
+            data = (json.loads(line)['number'] for line in f if line.strip())
+        else:
+            data = json.load(f)
         for number in data:
-            clean = clean_number(number)
-            if clean:
-                contacts.add(clean)
+            key = number_key(number)
+            if key is not None:
+                contacts.add(key)
     return contacts
 
-def is_spam(record, contacts, record_type):
-    number = record.get('number')
-    if not number: return False
-    
-    # Specific allowed numbers
-    if number == '7072668159':
-        return False
-    
-    # 406 area code is never spam
-    if number.startswith('406'):
-        return False
-    
-    # SMS with name field = not spam (strong signal to keep)
-    if record_type == 'sms' and record.get('name'):
-        return False
+def find_contacts_file():
+    return next((name for name in CONTACTS_FILES if os.path.exists(name)), CONTACTS_FILES[-1])
+
+def load_contacts(filename):
+    """Contacts as a set-like of number keys (a .jsonl/.json or its .bin keyset)"""
+    if filename.endswith('.bin'):
+        return MappedKeySet(filename)
+    path = keyset_path(filename)
+    if not is_fresh(path, filename):
+        keys = read_contact_keys(filename)
+        try:
+            write_keyset(path, keys)
+        except OSError:
+            return keys  # read-only directory: just use the parsed set
+    return MappedKeySet(path)
+
+def is_spam(record, contacts, record_type, rules=RULES):
+    return rules.evaluate(record, contacts, record_type)[0]
+
+def new_results():
+    """Empty (stats, number_counter, not_spam_reasons, sample_spam_records, area_codes).
+
+    number_counter is keyed by number key and area_codes by integer area code.
+    """
+    return Counter(), Counter(), Counter(), [], Counter()
+
+def tally(record, contacts, record_type, results, rules=RULES):
+    """Classify one record and add it to results; returns whether it is spam"""
+    stats, number_counter, not_spam_reasons, sample_spam_records, area_codes = results
+    stats['total'] += 1
     
-    # Known spam carriers (case insensitive)
+    # Track detailed spam/not-spam reasons
     carrier = str(record.get('carrier') or '').lower()
-    if carrier and any(spam_carrier.lower() in carrier for spam_carrier in SPAM_CARRIERS):
-        return True
-    
-    # Any VoIP or related carrier type
-    carrier_type = str(record.get('carrier_type') or '').lower()
-    if carrier_type and any(vtype in carrier_type for vtype in ['voip', 'wireless', 'mobil']):
-        return True
+    key = number_key(record.get('number'))
     
-    # Any number not in contacts is spam
-    return number not in contacts
-
-def process_file(infile, outfile, contacts, record_type):
-    spam_records = []
-    stats = Counter()
-    number_counter = Counter()
-    not_spam_reasons = Counter()
-    sample_spam_records = []  # Keep a few samples
-    area_codes = Counter()
+    # Track area codes
+    area = area_code(key)
+    if area is not None:
+        area_codes[area] += 1
     
-    with open(infile) as f:
-        for line in f:
-            record = json.loads(line.strip())
-            stats['total'] += 1
-            
-            # Track detailed spam/not-spam reasons
-            carrier = str(record.get('carrier') or '').lower()
-            carrier_type = str(record.get('carrier_type') or '').lower()
-            number = record.get('number')
-            
-            # Track area codes
-            if number and len(number) >= 3:
-                area_codes[number[:3]] += 1
+    spam, reason = rules.evaluate(record, contacts, record_type, key)
+    if spam:
+        stats['spam'] += 1
+        number_counter[key] += 1
+        if carrier:
+            stats[f"spam_carrier_{carrier}"] += 1
             
-            if is_spam(record, contacts, record_type):
-                spam_records.append(record)
-                stats['spam'] += 1
-                if number:
-                    number_counter[number] += 1
-                if carrier:
-                    stats[f"spam_carrier_{carrier}"] += 1
-                    
-                # Track why it's spam
-                if any(sc.lower() in carrier for sc in SPAM_CARRIERS):
-                    stats['spam_known_carrier'] += 1
-                elif any(vtype in carrier_type for vtype in ['voip', 'wireless', 'mobil']):
-                    stats['spam_voip_type'] += 1
-                else:
-                    stats['spam_not_in_contacts'] += 1
-                
-                # Keep sample records (up to 3 of each type)
-                if len(sample_spam_records) < 3:
-                    sample_spam_records.append(record)
-            else:
-                stats['not_spam'] += 1
-                # Track why it's not spam
-                if number == '7072668159':
-                    not_spam_reasons['allowed_number'] += 1
-                elif number and number.startswith('406'):
-                    not_spam_reasons['area_code_406'] += 1
-                elif number in contacts:
-                    not_spam_reasons['in_contacts'] += 1
-                elif record_type == 'sms' and record.get('name'):
-                    not_spam_reasons['sms_has_name'] += 1
+        # Track why it's spam
+        stats[reason] += 1
+        
+        # Keep sample records (up to 3 of each type)
+        if len(sample_spam_records) < 3:
+            sample_spam_records.append(record)
+    else:
+        stats['not_spam'] += 1
+        # Track why it's not spam
+        if reason:
+            not_spam_reasons[reason] += 1
+    return spam
+
+def merge_results(results, other):
+    for mine, theirs in zip(results[:3] + results[4:], other[:3] + other[4:]):
+        mine.update(theirs)
+    results[3].extend(other[3][:3 - len(results[3])])
+    return results
+
+def process_file(infile, outfile, contacts, record_type, rules=RULES):
+    """Classify infile into outfile; either may be .dat, .parquet or .arrow"""
+    results = new_results()
     
-    with open(outfile, 'w') as f:
-        for record in spam_records:
-            f.write(json.dumps(record) + '\n')
+    with RecordWriter(outfile) as out:
+        for record in read_records(infile):
+            if tally(record, contacts, record_type, results, rules):
+                out.write(record)
     
-    return stats, number_counter, not_spam_reasons, sample_spam_records, area_codes
+    return results
 
 def format_record(record):
     """Format a record for display"""
@@ -137,59 +125,79 @@ def format_record(record):
             f"\n    Duration: {duration}"
             f"\n    Name: {name}")
 
-def print_spam_details(record_type, number, count, carriers):
-    carrier_info = carriers.get(number, {})
-    print(f"  {number}: {count} times - {carrier_info.get('carrier', 'Unknown')} "
+def print_spam_details(record_type, key, count, carriers):
+    carrier_info = carriers.get(key, {})
+    print(f"  {format_number(key)}: {count} times - {carrier_info.get('carrier', 'Unknown')} "
           f"({carrier_info.get('carrier_type', 'Unknown')})")
 
-if __name__ == "__main__":
-    contacts = load_contacts('contacts.json')
+def print_report(record_type, results, carriers):
+    stats, number_counter, not_spam_reasons, sample_records, area_codes = results
+
+    print(f"\n{'='*50}")
+    print(f"{record_type.upper()} Analysis:")
+    print(f"{'='*50}")
+    print(f"Total records processed: {stats['total']}")
+    
+    # Spam stats
+    print("\nSPAM STATISTICS:")
+    print(f"Total spam records: {stats['spam']}")
+    print(f"  - Known spam carriers: {stats.get(RULES.carrier_reason, 0)}")
+    print(f"  - VoIP/Wireless/Mobile: {stats.get(RULES.type_reason, 0)}")
+    print(f"  - Not in contacts: {stats.get(RULES.not_in_contacts_reason, 0)}")
+    
+    # Non-spam stats
+    print(f"\nNON-SPAM STATISTICS:")
+    print(f"Total non-spam records: {stats['not_spam']}")
+    for reason, count in not_spam_reasons.most_common():
+        print(f"  - {reason}: {count}")
+    
+    # Area code stats
+    print(f"\nTOP AREA CODES:")
+    for area_code, count in area_codes.most_common(5):
+        print(f"  {area_code}: {count} calls")
+    
+    # Top spammers
+    print(f"\nTOP 10 SPAM {record_type.upper()} NUMBERS:")
+    for num, count in number_counter.most_common(10):
+        print_spam_details(record_type, num, count, carriers)
+        
+    # Sample records
+    if sample_records:
+        print(f"\nSAMPLE SPAM {record_type.upper()} RECORDS:")
+        for i, record in enumerate(sample_records, 1):
+            print(f"\nRecord {i}:{format_record(record)}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Classify calls/voicemails/sms records as spam")
+    parser.add_argument('--batch', action='store_true',
+                        help="vectorized classifier (needs numpy), same output as process_file")
+    parser.add_argument('--contacts', help="contacts file (default contacts.jsonl, else contacts.json)")
+    return parser.parse_args(argv)
+
+def main(argv=None, open_contacts=load_contacts, open_carriers=CarrierStore):
+    args = parse_args(argv)
+    classify = process_file
+    if args.batch:
+        from spam_batch import process_file as classify
+
+    contacts = open_contacts(args.contacts or find_contacts_file())
     print(f"Loaded {len(contacts)} contacts")
     
     # Load carriers for detailed reporting
-    carriers = {}
-    with open('numbers.dat') as f:
-        for line in f:
-            data = json.loads(line.strip())
-            carriers[data.get('number')] = data
+    carriers = open_carriers('numbers.dat')
     
     # Process each type
+    # Inputs may be .dat, .parquet or .arrow (as written by split.py --format);
+    # spam_*.dat outputs follow the input's format
     for record_type in ['calls', 'voicemails', 'sms']:
-        infile = f"{record_type}.dat"
-        outfile = f"spam_{record_type}.dat"
-        stats, number_counter, not_spam_reasons, sample_records, area_codes = process_file(
-            infile, outfile, contacts, record_type)
-        
-        print(f"\n{'='*50}")
-        print(f"{record_type.upper()} Analysis:")
-        print(f"{'='*50}")
-        print(f"Total records processed: {stats['total']}")
-        
-        # Spam stats
-        print("\nSPAM STATISTICS:")
-        print(f"Total spam records: {stats['spam']}")
-        print(f"  - Known spam carriers: {stats.get('spam_known_carrier', 0)}")
-        print(f"  - VoIP/Wireless/Mobile: {stats.get('spam_voip_type', 0)}")
-        print(f"  - Not in contacts: {stats.get('spam_not_in_contacts', 0)}")
-        
-        # Non-spam stats
-        print(f"\nNON-SPAM STATISTICS:")
-        print(f"Total non-spam records: {stats['not_spam']}")
-        for reason, count in not_spam_reasons.most_common():
-            print(f"  - {reason}: {count}")
-        
-        # Area code stats
-        print(f"\nTOP AREA CODES:")
-        for area_code, count in area_codes.most_common(5):
-            print(f"  {area_code}: {count} calls")
-        
-        # Top spammers
-        print(f"\nTOP 10 SPAM {record_type.upper()} NUMBERS:")
-        for num, count in number_counter.most_common(10):
-            print_spam_details(record_type, num, count, carriers)
-            
-        # Sample records
-        if sample_records:
-            print(f"\nSAMPLE SPAM {record_type.upper()} RECORDS:")
-            for i, record in enumerate(sample_records, 1):
-                print(f"\nRecord {i}:{format_record(record)}")
+        infile = find_record_file(record_type)
+        outfile = record_file(f"spam_{record_type}", file_format(infile))
+        with metrics.stage(f'spam_{record_type}'):
+            results = classify(infile, outfile, contacts, record_type)
+        stats = results[0]
+        metrics.inc('records_classified', stats['total'], record_type=record_type)
+        metrics.inc('spam_records', stats['spam'], record_type=record_type)
+        print_report(record_type, results, carriers)
+
+if __name__ == "__main__":
+    main()
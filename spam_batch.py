@@ -0,0 +1,181 @@
+import json
+from array import array
+from collections import Counter
+
+import numpy as np
+
+from columnar import RecordWriter, file_format, read_table
+from phone import area_code, number_key
+from spam import RULES
+
+"""
+🤔 Batch spam classification:
+- Stream a .dat file into columns: per-row integer codes for number, carrier and
+  carrier_type (factorized in first-seen order) plus a flag per record-rule field;
+  the parsed records are not kept, so memory follows the row count, not the row size
+- Evaluate the compiled spam_rules.json checks once per *distinct* value (carrier
+  patterns, contacts membership, allowlist/prefixes) into small lookup tables
+- Gather the tables by code and combine them with NumPy in one pass to get the spam
+  decision and reason code for every row, in the same order as RuleSet.evaluate
+- Counters are rebuilt in first-occurrence order so most_common() ties print exactly
+  like spam.process_file
+- Parquet/Arrow inputs are read column-projected (number, carrier, carrier_type and
+  flag fields only); Arrow dictionary indices serve directly as the codes, and spam
+  rows are written by filtering the full table rather than row by row
+- .dat spam rows are written by a second streaming pass that copies the raw lines at
+  the spam row indices (only re-parsed when the output is Parquet/Arrow)
+"""
+
+def table(values, func, dtype=bool):
+    return np.fromiter((func(v) for v in values), dtype=dtype, count=len(values))
+
+def ordered_counter(codes, labels):
+    """Counter of labels[code] with keys inserted in first-occurrence order"""
+    counter = Counter()
+    if not len(codes): return counter
+    uniques, first, counts = np.unique(codes, return_index=True, return_counts=True)
+    for i in np.argsort(first, kind='stable'):
+        counter[labels[uniques[i]]] = int(counts[i])
+    return counter
+
+def load_columns(infile, flag_fields=('name',)):
+    """Stream a .dat file into columns; records is None (rows stay in the file)"""
+    fields = ('number', 'carrier', 'carrier_type')
+    indexes = [{} for _ in fields]
+    codes = [array('q') for _ in fields]
+    flags = {field: bytearray() for field in flag_fields}
+    with open(infile) as f:
+        for line in f:
+            record = json.loads(line)
+            for field, index, column in zip(fields, indexes, codes):
+                column.append(index.setdefault(record.get(field), len(index)))
+            for field, flag in flags.items():
+                flag.append(bool(record.get(field)))
+    columns = [(np.frombuffer(column, dtype=np.int64), list(index)) for column, index in zip(codes, indexes)]
+    return None, *columns, {field: np.frombuffer(flag, dtype=bool) for field, flag in flags.items()}
+
+def copy_rows(infile, outfile, rows):
+    """Copy the .dat lines at ascending indices rows into outfile; returns the first 3 as dicts"""
+    wanted = iter(rows.tolist())
+    target = next(wanted, None)
+    sample = []
+    with open(infile) as f, RecordWriter(outfile) as out:
+        for i, line in enumerate(f):
+            if target is None: break
+            if i != target: continue
+            target = next(wanted, None)
+            if len(sample) < 3:
+                sample.append(json.loads(line))
+            if out.f is not None:
+                out.f.write(line if line.endswith('\n') else line + '\n')
+            else:
+                out.write(json.loads(line))
+    return sample
+
+def column_codes(column):
+    """(codes, uniques) from an Arrow column via its dictionary; nulls map to a trailing None"""
+    import pyarrow as pa
+    column = column.combine_chunks()
+    if not pa.types.is_dictionary(column.type):
+        column = column.dictionary_encode()
+    uniques = column.dictionary.to_pylist() + [None]
+    codes = column.indices.fill_null(len(uniques) - 1).to_numpy(zero_copy_only=False).astype(np.int64)
+    return codes, uniques
+
+def load_table_columns(infile, flag_fields=('name',)):
+    """load_columns for Parquet/Arrow input; records is None (rows stay in the file)"""
+    import pyarrow.compute as pc
+    table = read_table(infile, ['number', 'carrier', 'carrier_type', *flag_fields]).unify_dictionaries()
+    def codes(name):
+        if name in table.column_names:
+            return column_codes(table.column(name))
+        return np.zeros(table.num_rows, dtype=np.int64), [None]
+    flags = {}
+    for field in flag_fields:
+        if field in table.column_names:
+            flag = pc.fill_null(pc.not_equal(table.column(field), ''), False)
+            flags[field] = flag.combine_chunks().to_numpy(zero_copy_only=False)
+        else:
+            flags[field] = np.zeros(table.num_rows, dtype=bool)
+    return None, codes('number'), codes('carrier'), codes('carrier_type'), flags
+
+def classify(columns, contacts, record_type, rules=RULES):
+    """Return (spam mask, reason codes) for every row.
+
+    Reason codes index rules.reasons; -1 means no reason.
+    """
+    _, (number_codes, numbers), (carrier_codes, carriers), (type_codes, carrier_types), flags = columns
+    reasons = {reason: i for i, reason in enumerate(rules.reasons)}
+    rows = len(number_codes)
+    keys = [number_key(n) for n in numbers]
+
+    # Per distinct value tables
+    has_number = table(keys, lambda k: k is not None)
+    allow = table(keys, lambda k: reasons[rules.allow_reason(k)] if k is not None and rules.allow_reason(k) else -1,
+                  dtype=np.int64)
+    in_contacts = table(keys, lambda k: k in contacts)
+    known = table(carriers, rules.carrier_is_spam)[carrier_codes]
+    voip = table(carrier_types, rules.type_is_spam)[type_codes]
+
+    # Record type rules apply in order; the first truthy field wins
+    record_rule = np.full(rows, -1, dtype=np.int64)
+    for record_types, field, reason in reversed(rules.record_rules):
+        if record_type in record_types:
+            record_rule[flags[field]] = reasons[reason]
+
+    has_number, allow, in_contacts = has_number[number_codes], allow[number_codes], in_contacts[number_codes]
+    kept = (allow >= 0) | (record_rule >= 0)
+    spam = has_number & ~kept & (known | voip | ~in_contacts)
+    reason = np.select(
+        [~has_number, allow >= 0, record_rule >= 0, known, voip, in_contacts],
+        [record_rule, allow, record_rule, reasons[rules.carrier_reason], reasons[rules.type_reason],
+         reasons[rules.in_contacts_reason]],
+        reasons[rules.not_in_contacts_reason])
+    return spam, reason
+
+def process_file(infile, outfile, contacts, record_type, rules=RULES):
+    """Vectorized equivalent of spam.process_file, with identical return values"""
+    flag_fields = {field for _, field, _ in rules.record_rules}
+    columnar = file_format(infile) != 'dat'
+    columns = (load_table_columns if columnar else load_columns)(infile, flag_fields)
+    _, (number_codes, numbers), (carrier_codes, carriers), _, _ = columns
+    spam, reason = classify(columns, contacts, record_type, rules)
+    spam_rows = np.flatnonzero(spam)
+    rows = len(number_codes)
+
+    stats = Counter()
+    if rows:
+        stats['total'] = rows
+    if len(spam_rows):
+        stats['spam'] = len(spam_rows)
+    if rows - len(spam_rows):
+        stats['not_spam'] = rows - len(spam_rows)
+
+    carrier_lower = [str(c or '').lower() for c in carriers]
+    named_carrier = table(carrier_lower, bool)[carrier_codes[spam_rows]]
+    stats.update(ordered_counter(carrier_codes[spam_rows[named_carrier]],
+                                 [f"spam_carrier_{c}" for c in carrier_lower]))
+    stats.update(ordered_counter(reason[spam_rows], rules.reasons))
+
+    keys = [number_key(n) for n in numbers]
+    number_counter = ordered_counter(number_codes[spam_rows], keys)
+    not_spam_reasons = ordered_counter(reason[~spam & (reason >= 0)], rules.reasons)
+
+    # Area codes of every row with a NANP number
+    area_index = {}
+    number_area = table(keys, lambda k: area_index.setdefault(area_code(k), len(area_index))
+                        if area_code(k) is not None else -1, dtype=np.int64)
+    row_area = number_area[number_codes]
+    area_codes = ordered_counter(row_area[row_area >= 0], list(area_index))
+
+    if columnar:
+        import pyarrow as pa
+        with RecordWriter(outfile) as out:
+            spam_table = read_table(infile).filter(pa.array(spam))
+            out.write_table(spam_table)
+        sample_spam_records = [{k: v for k, v in row.items() if v is not None}
+                               for row in spam_table.slice(0, 3).to_pylist()]
+    else:
+        sample_spam_records = copy_rows(infile, outfile, spam_rows)
+
+    return stats, number_counter, not_spam_reasons, sample_spam_records, area_codes
@@ -1,4 +1,10 @@
-import sys, json
+import argparse, json, metrics
+from collections import Counter
+from itertools import groupby
+from carrier_store import CarrierStore
+from columnar import FORMATS, RecordWriter, record_file
+from phone import clean_number, format_number, number_key
+from records import BlobWriter, RowParser, assemble_rows, iter_records, split_fields, with_learned_columns
 
 """
 🤔 Key changes and thinking:
@@ -6,22 +12,16 @@ import sys, json
 - Added tracking of missing numbers
 - Writing new numbers to separate file for later processing
 - Keeping core splitting/enrichment logic clean
+- Streaming dump -> parse -> enrich -> .dat writers so memory doesn't grow with the dump
+- Rows (and voicemail payloads) are reassembled by records.assemble_rows; --blobs keeps
+  decoded audio out of voicemails.dat
 """
 
-def clean_number(number):
-    if not number: return None
-    digits = ''.join(c for c in str(number) if c.isdigit())
-    return digits[-10:] if len(digits) >= 10 else None
-
-def parse_record(record):
+def parse_record(record, parser=split_fields):
     if isinstance(record, list):
         record = ' '.join(part for part in record if not part.strip().startswith('Row:'))
     
-    parsed = {}
-    for k_v in record.split(','):
-        if '=' in k_v:
-            k, *v = k_v.split('=')
-            parsed[k.strip()] = v[0] if v else None
+    parsed = parser(record)
     
     if 'address' in parsed:  # Handle SMS records
         parsed['number'] = parsed['address']
@@ -31,84 +31,93 @@ def parse_record(record):
         
     return parsed
 
-def process_voicemail(records, i):
-    parts = records[i:i+3]
-    if len(parts) < 3: return None, i + 1
-    
-    if not (isinstance(parts[0], str) and parts[0].strip().startswith('Row:') and
-            isinstance(parts[1], str) and len(parts[1].strip()) <= 10 and
-            isinstance(parts[2], str) and parts[2].strip().startswith(':ABww')):
-        return None, i + 1
-    
-    main_part = parts[0].split('Row:', 1)[1].strip()
-    combined = main_part + ', ' + '_encoded_data=' + parts[2].strip()
-    return combined, i + 3
-
 def load_carriers(filename):
-    carriers = {}
-    with open(filename) as f:
-        for line in f:
-            data = json.loads(line.strip())
-            number = clean_number(data.get('number'))
-            if number:
-                carriers[number] = {
-                    'carrier': data.get('carrier', 'Unknown'),
-                    'carrier_type': data.get('carrier-type', data.get('carrier_type', 'Unknown'))
-                }
-    return carriers
+    return CarrierStore(filename)
+
+RECORD_TYPES = {'calls': 'calls', 'voicemail': 'voicemails', 'sms_inbox': 'sms'}
+
+def enrich_record(record, carriers, new_numbers):
+    # Track missing numbers (by key) and enrich with carrier data
+    key = number_key(record.get('number'))
+    if key is not None:
+        carrier = carriers.get(key)
+        if carrier:
+            record.update(carrier)
+        else:
+            new_numbers.add(key)
+    return record
+
+def iter_enriched(raw_records, carriers, new_numbers, blobs=None):
+    """Parse and enrich a stream of (section, raw) pairs.
+
+    Yields (output_type, record) where output_type is calls/voicemails/sms;
+    keys of numbers missing from carriers are added to new_numbers as we go.
+    Voicemail payloads go to blobs (a records.BlobWriter) when given.
+    """
+    for section, pairs in groupby(raw_records, key=lambda pair: pair[0]):
+        if section not in RECORD_TYPES: continue
+        rows = assemble_rows((raw for _, raw in pairs), section == 'voicemail', blobs)
+        output_type = RECORD_TYPES[section]
+        parser = RowParser()
+
+        for raw in with_learned_columns(rows, parser):
+            yield output_type, enrich_record(parse_record(raw, parser), carriers, new_numbers)
 
 def process_records(raw_data, carriers):
-    calls, voicemails, sms = [], [], []
+    output = {'calls': [], 'voicemails': [], 'sms': []}
     new_numbers = set()
-    
-    for record_type in ['calls', 'voicemail', 'sms_inbox']:
-        records = raw_data.get(record_type, [])
-        i = 0
-        while i < len(records):
-            if record_type == 'voicemail':
-                record_str, next_i = process_voicemail(records, i)
-                i = next_i
-                if not record_str: continue
-                record = parse_record(record_str)
-            else:
-                record = parse_record(records[i])
-                i += 1
-            
-            # Track missing numbers and enrich with carrier data
-            if record.get('number'):
-                if record['number'] in carriers:
-                    record.update(carriers[record['number']])
-                elif record['number']:
-                    new_numbers.add(record['number'])
-                    
-            # Store in appropriate list
-            if record_type == 'calls': calls.append(record)
-            elif record_type == 'voicemail': voicemails.append(record)
-            else: sms.append(record)
-    
-    return calls, voicemails, sms, new_numbers
+    raw_records = ((record_type, raw) for record_type in RECORD_TYPES
+                   for raw in raw_data.get(record_type) or [])
+    for output_type, record in iter_enriched(raw_records, carriers, new_numbers):
+        output[output_type].append(record)
+    return output['calls'], output['voicemails'], output['sms'], new_numbers
 
 def write_records(filename, records):
     with open(filename, 'w') as f:
         for record in records:
             f.write(json.dumps(record) + '\n')
 
-if __name__ == "__main__":
-    with open(sys.argv[1]) as f:
-        data = json.load(f)
-    
-    carriers = load_carriers('numbers.dat')
-    calls, voicemails, sms, new_numbers = process_records(data, carriers)
-    
-    print(f"Processed records - Calls: {len(calls)}, Voicemails: {len(voicemails)}, SMS: {len(sms)}")
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Split a dump into calls/voicemails/sms record files")
+    parser.add_argument('dump', help="phone_records_*.json")
+    parser.add_argument('--format', choices=FORMATS, default='dat',
+                        help="dat (JSON lines), parquet or arrow (needs pyarrow)")
+    parser.add_argument('--blobs', metavar='PATH',
+                        help="write decoded voicemail audio to PATH; records keep _blob_offset/_blob_length")
+    return parser.parse_args(argv)
+
+def main(argv=None, open_carriers=load_carriers):
+    args = parse_args(argv)
+    carriers = open_carriers('numbers.dat')
+    new_numbers = set()
+    counts = Counter()
+
+    outputs = {output_type: RecordWriter(record_file(output_type, args.format))
+               for output_type in RECORD_TYPES.values()}
+    blobs = BlobWriter(args.blobs) if args.blobs else None
+    try:
+        with metrics.stage('split'):
+            raw_records = iter_records(args.dump, RECORD_TYPES)
+            for output_type, record in iter_enriched(raw_records, carriers, new_numbers, blobs):
+                outputs[output_type].write(record)
+                counts[output_type] += 1
+    finally:
+        for out in outputs.values():
+            out.close()
+        if blobs is not None:
+            blobs.close()
+    for output_type, count in counts.items():
+        metrics.inc('records_parsed', count, record_type=output_type)
+    metrics.inc('new_numbers', len(new_numbers))
+
+    print(f"Processed records - Calls: {counts['calls']}, Voicemails: {counts['voicemails']}, SMS: {counts['sms']}")
     print(f"Found {len(new_numbers)} new numbers to lookup")
-    
-    write_records('calls.dat', calls)
-    write_records('voicemails.dat', voicemails)
-    write_records('sms.dat', sms)
-    
+
     # Write new numbers for later processing
     if new_numbers:
         with open('new_numbers.txt', 'w') as f:
-            for number in sorted(new_numbers):
-                f.write(f"{number}\n")
\ No newline at end of file
+            for key in sorted(new_numbers):
+                f.write(f"{format_number(key)}\n")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+import argparse, json, random
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+"""
+🤔 Local stand-in for the carrier lookup API, so lookups can be exercised without
+carrierlookup.com or a key:
+- `python stub_api.py` then `python make_numbers.py new_numbers.txt --url http://127.0.0.1:8765/api/lookup`
+- Answers {"Response": {"carrier": ..., "carrier_type": ...}} like the real API; the
+  carrier is derived from the number, so repeated runs agree
+- Configurable shares of throttling (429 + Retry-After), server errors (503), empty
+  answers ({}), and malformed replies (non-JSON, a JSON list, a string Response)
+- Keep-alive HTTP/1.1, one thread per connection, like the pooled lookup client expects
+"""
+
+CARRIERS = [('VERIZON WIRELESS', 'wireless'), ('AT&T MOBILITY', 'mobile'), ('BANDWIDTH', 'voip'),
+            ('TELNYX LLC', 'voip'), ('CENTURYLINK', 'landline')]
+MALFORMED = [b'<html>Service Unavailable</html>', b'["not", "an", "object"]',
+             b'{"Response": "error: daily quota exceeded"}']
+
+def make_handler(args, rng):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def reply(self, status, body=b'', headers=()):
+            self.send_response(status)
+            for name, value in headers:
+                self.send_header(name, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            number = parse_qs(urlparse(self.path).query).get('number', [''])[0]
+            roll = rng.random()
+            if roll < args.throttle:
+                return self.reply(429, headers=[('Retry-After', '0')])
+            roll -= args.throttle
+            if roll < args.errors:
+                return self.reply(503)
+            roll -= args.errors
+            if roll < args.empty:
+                return self.reply(200, b'{}')
+            roll -= args.empty
+            if roll < args.malformed:
+                return self.reply(200, rng.choice(MALFORMED))
+            digits = ''.join(c for c in number if c.isdigit()) or '0'
+            carrier, carrier_type = CARRIERS[int(digits) % len(CARRIERS)]
+            self.reply(200, json.dumps({'Response': {'carrier': carrier, 'carrier_type': carrier_type}}).encode())
+
+        def log_message(self, *args):
+            pass
+    return Handler
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Stub carrier lookup API for local testing")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--throttle', type=float, default=0.0, help="share of requests answered 429")
+    parser.add_argument('--errors', type=float, default=0.0, help="share of requests answered 503")
+    parser.add_argument('--empty', type=float, default=0.0, help="share of numbers without data ({})")
+    parser.add_argument('--malformed', type=float, default=0.0, help="share of malformed replies")
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(args, random.Random(args.seed)))
+    print(f"Stub lookup API on http://127.0.0.1:{args.port}/api/lookup")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
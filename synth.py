@@ -0,0 +1,122 @@
+import argparse, base64, json, os, random
+from itertools import accumulate
+
+from extract import PROVIDERS, write_dump
+
+"""
+🤔 Synthetic datasets at any scale, so the pipeline can be measured without a phone
+or carrierlookup.com:
+- Raw `content query` rows per provider written as the {name}.lines files extract.py
+  produces, then assembled with extract.write_dump into phone_records_synth.json
+- Calls, three-line voicemail rows (Row line, short line, `:ABww` payload) as the
+  devices produce them, and SMS bodies with embedded commas and `=`
+- Numbers are drawn Zipf-style so a few numbers dominate like real spam callers,
+  in the mix of formats phones actually store (+1..., 10 digits, 11 digits)
+- contacts.json in contacts.py's layout and a numbers.dat carrier store covering
+  most (not all) numbers, including some negative entries
+- Everything is derived from --seed, so datasets are reproducible
+"""
+
+CARRIERS = [('VERIZON WIRELESS', 'wireless'), ('AT&T MOBILITY', 'mobile'), ('BANDWIDTH', 'voip'),
+            ('TELNYX LLC', 'voip'), ('CENTURYLINK', 'landline'), ('FRONTIER', 'landline'),
+            (None, None)]
+BODIES = ['See you at 5', 'Call me, ok?', 'Your code is a=b, c=d', 'Thanks!!', '',
+          'URGENT: your car warranty, act now', 'Reply STOP to opt out, msg&data rates apply']
+NAMES = ['Alice Smith', 'Bob Jones', 'Carol, the plumber', 'Dan', 'Eve Adams']
+START_DATE = 1600000000000
+
+def make_numbers(rng, distinct):
+    numbers = ['%010d' % rng.randrange(2000000000, 9999999999) for _ in range(distinct)]
+    numbers[:min(50, distinct)] = ['406%07d' % i for i in range(min(50, distinct))]
+    return numbers
+
+def formatted(rng, number):
+    return rng.choice(['+1' + number, number, '1' + number])
+
+class NumberPicker:
+    """Zipf-weighted choice over numbers"""
+    def __init__(self, rng, numbers, skew=1.1):
+        self.rng = rng
+        self.numbers = numbers
+        self.cum_weights = list(accumulate(1 / (rank + 1) ** skew for rank in range(len(numbers))))
+
+    def __call__(self):
+        return self.rng.choices(self.numbers, cum_weights=self.cum_weights)[0]
+
+def call_rows(rng, pick, n):
+    for i in range(n):
+        yield (f"Row: {i} _id={i + 1}, number={formatted(rng, pick())}, date={START_DATE + i * 60000}, "
+               f"duration={rng.choice([0, 0, 1, rng.randrange(600)])}, type={rng.choice([1, 2, 3])}, "
+               f"name=NULL, geocoded_location=United States")
+
+def voicemail_rows(rng, pick, n):
+    for i in range(n):
+        payload = base64.b64encode(rng.randbytes(rng.randrange(48, 240))).decode()
+        yield (f"Row: {i} _id={i + 1}, number={formatted(rng, pick())}, date={START_DATE + i * 360000}, "
+               f"duration={rng.randrange(5, 120)}, source_package=com.google.android.dialer, has_content=1")
+        yield rng.choice(['AMR', 'audio', 'amr-wb'])
+        yield ':ABww' + payload
+
+def sms_rows(rng, pick, n, type_=1):
+    for i in range(n):
+        yield (f"Row: {i} _id={i + 1}, thread_id={rng.randrange(1, 500)}, address={formatted(rng, pick())}, "
+               f"person=NULL, date={START_DATE + i * 30000}, read=1, status=-1, type={type_}, "
+               f"body={rng.choice(BODIES)}, seen=1")
+
+def write_lines(path, rows):
+    with open(path, 'w') as f:
+        for row in rows:
+            f.write(row + '\n')
+
+def synth_dataset(outdir, calls=10000, voicemails=1000, sms=10000, distinct=5000,
+                  contact_fraction=0.2, known_fraction=0.9, seed=0):
+    """Write {provider}.lines, phone_records_synth.json, contacts.json and numbers.dat to outdir"""
+    os.makedirs(outdir, exist_ok=True)
+    rng = random.Random(seed)
+    numbers = make_numbers(rng, distinct)
+    pick = NumberPicker(rng, numbers)
+
+    rows = {'calls': call_rows(rng, pick, calls), 'voicemail': voicemail_rows(rng, pick, voicemails),
+            'sms_inbox': sms_rows(rng, pick, sms), 'sms_sent': sms_rows(rng, pick, sms // 4, type_=2)}
+    for name in PROVIDERS:
+        write_lines(os.path.join(outdir, f'{name}.lines'), rows[name])
+    dump = os.path.join(outdir, 'phone_records_synth.json')
+    write_dump(dump, outdir, list(PROVIDERS))
+
+    contacts = {}
+    for number in rng.sample(numbers, int(len(numbers) * contact_fraction)):
+        name = rng.choice(NAMES)
+        contacts[number] = {'name': name, 'raw_number': formatted(rng, number), 'normalized_number': number,
+                            'raw_data': {'display_name': name, 'number': number}}
+    with open(os.path.join(outdir, 'contacts.json'), 'w') as f:
+        json.dump(contacts, f, indent=2)
+
+    with open(os.path.join(outdir, 'numbers.dat'), 'w') as f:
+        for number in numbers:
+            if rng.random() >= known_fraction: continue
+            carrier, carrier_type = rng.choice(CARRIERS)
+            if carrier:
+                record = {'carrier_type': carrier_type, 'carrier': carrier, 'number': number}
+            else:
+                record = {'number': number, 'status': 'unknown'}
+            f.write(json.dumps(record) + '\n')
+    return dump
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate a synthetic dump, contacts and carrier store")
+    parser.add_argument('outdir')
+    parser.add_argument('--calls', type=int, default=10000)
+    parser.add_argument('--voicemails', type=int, default=1000)
+    parser.add_argument('--sms', type=int, default=10000)
+    parser.add_argument('--numbers', type=int, default=5000, help="distinct phone numbers")
+    parser.add_argument('--contact-fraction', type=float, default=0.2)
+    parser.add_argument('--known-fraction', type=float, default=0.9, help="share of numbers in numbers.dat")
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    dump = synth_dataset(args.outdir, args.calls, args.voicemails, args.sms, args.numbers,
+                         args.contact_fraction, args.known_fraction, args.seed)
+    print(f"Wrote {dump} with {args.calls} calls, {args.voicemails} voicemails, "
+          f"{args.sms + args.sms // 4} SMS over {args.numbers} numbers")
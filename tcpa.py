@@ -0,0 +1,123 @@
+import sys, time
+from importlib import import_module
+
+"""
+🤔 One entry point for the scripts, for cron jobs that chain them many times an hour:
+- `tcpa <command> [args]` runs the script's main() in-process; arguments are exactly
+  the script's own (`tcpa lookup --help` is make_numbers.py's help)
+- Nothing is imported up front: a command's module (and whatever heavy dependency it
+  needs: pyarrow, numpy, requests) is imported only when that command runs, and
+  make_numbers only imports requests when some number actually needs a lookup
+- Commands chain with `+` in one process: `tcpa extract + split {dump} + lookup
+  new_numbers.txt + spam`. The carrier store and contacts are opened once and shared
+  by every step (lookups added by `lookup` are visible to `spam` straight away)
+- {dump}/{contacts}/{sample} in a step's arguments are replaced with the file an
+  earlier extract/contacts/sample step wrote
+- --timing prints startup and per-step wall time
+<startup>
+  python -X importtime tcpa.py --help    # only sys/time/importlib before dispatch
+</startup>
+"""
+
+# command -> (module, what it does, state shared through main()'s keyword arguments)
+COMMANDS = {
+    'extract': ('extract', "pull call/voicemail/SMS records over adb", ()),
+    'contacts': ('contacts', "pull contacts over adb", ()),
+    'split': ('split', "split a dump into calls/voicemails/sms record files", ('open_carriers',)),
+    'lookup': ('make_numbers', "look up carriers for new numbers", ('open_carriers',)),
+    'spam': ('spam', "classify records as spam and report", ('open_contacts', 'open_carriers')),
+    'stats': ('parse', "per-field stats and CSVs for a dump", ()),
+    'sample': ('sample', "sample logs, dumps or record files", ('open_carriers',)),
+}
+# command -> placeholder for the file its main() returns
+OUTPUTS = {'extract': 'dump', 'contacts': 'contacts', 'sample': 'sample'}
+
+class Session:
+    """State shared by the steps of one chain"""
+    def __init__(self):
+        self.contacts = {}
+        self.carriers = {}
+        self.outputs = {}
+
+    def open_contacts(self, path):
+        if path not in self.contacts:
+            from spam import load_contacts
+            self.contacts[path] = load_contacts(path)
+        return self.contacts[path]
+
+    def open_carriers(self, path):
+        if path not in self.carriers:
+            from carrier_store import CarrierStore
+            self.carriers[path] = CarrierStore(path)
+        return self.carriers[path]
+
+    def run(self, command, argv):
+        module_name, _, shared = COMMANDS[command]
+        for name, path in self.outputs.items():
+            argv = [arg.replace('{' + name + '}', path) for arg in argv]
+        main = import_module(module_name).main
+        saved_argv, sys.argv = sys.argv, [f'tcpa {command}', *argv]  # for argparse's usage lines
+        try:
+            result = main(argv, **{name: getattr(self, name) for name in shared})
+        finally:
+            sys.argv = saved_argv
+        if command in OUTPUTS and result:
+            self.outputs[OUTPUTS[command]] = result
+        if command == 'contacts':
+            self.contacts.clear()  # a rewritten contacts file must be reloaded
+        return result
+
+    def close(self):
+        for store in self.carriers.values():
+            store.close()
+
+def split_chain(args):
+    """[[command, arg, ...], ...] from argv split on `+`"""
+    steps = [[]]
+    for arg in args:
+        if arg == '+':
+            steps.append([])
+        else:
+            steps[-1].append(arg)
+    return [step for step in steps if step]
+
+def usage():
+    lines = ["usage: tcpa [--timing] <command> [args...] [+ <command> [args...]]...", "", "commands:"]
+    lines += [f"  {command:<10}{description} ({module}.py)" for command, (module, description, _) in COMMANDS.items()]
+    lines += ["", "`tcpa <command> --help` for a command's options; {dump}/{contacts}/{sample}",
+              "in arguments refer to files written by earlier steps of the chain."]
+    return '\n'.join(lines)
+
+def main(argv=None):
+    start = time.perf_counter()
+    args = sys.argv[1:] if argv is None else argv
+    timing = '--timing' in args[:1]
+    if timing:
+        args = args[1:]
+    steps = split_chain(args)
+    if not steps or steps[0][0] in ('-h', '--help'):
+        print(usage())
+        return 0 if steps else 2
+    unknown = [step[0] for step in steps if step[0] not in COMMANDS]
+    if unknown:
+        print(f"tcpa: unknown command {unknown[0]!r}\n\n{usage()}", file=sys.stderr)
+        return 2
+
+    session = Session()
+    if timing:
+        print(f"[tcpa] startup {(time.perf_counter() - start) * 1000:.1f} ms", file=sys.stderr)
+    try:
+        for command, *command_args in steps:
+            step_start = time.perf_counter()
+            try:
+                session.run(command, command_args)
+            except SystemExit as e:  # argparse errors/--help, or a script bailing out: stop the chain
+                return e.code
+            if timing:
+                print(f"[tcpa] {command}: {time.perf_counter() - step_start:.3f}s", file=sys.stderr)
+    finally:
+        session.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())